@@ -1,3 +1,8 @@
+import time
+
+# Measured before any other import, time-to-online includes the imports
+boot_time = time.monotonic()
+
 import os
 import sys
 
@@ -13,22 +18,36 @@ from src.utils.chat_handler import ChatHandler
 from src.data.environment import DISCORD_TOKEN
 from src.commands.intents import basic_intents
 
-print("Hello (happy) world!")
-# Create intent
-intent = discord.Intents.default()
-intent.members = True
 
-# Create and start the client
-bot = BotClient(intents=intent)
+def create_bot():
+    """
+    Create the client and register every command, intent and handler (without connecting)
+
+    Returns:
+        BotClient: bot ready to run
+    """
+    # Create intent
+    intent = discord.Intents.default()
+    intent.members = True
+
+    # Create the client
+    bot = BotClient(intents=intent)
+    bot.boot_time = boot_time
+
+    # Register commands & intents
+    nlp_cmd.register_all(bot)
+    utility_cmd.register_all(bot)
+    genshin_cmd.register_all(bot)
 
-# Register commands & intents
-nlp_cmd.register_all(bot)
-utility_cmd.register_all(bot)
-genshin_cmd.register_all(bot)
+    basic_intents.register_all(bot)
 
-basic_intents.register_all(bot)
+    # Register NLP chat handler, the NLP model itself is loaded on first use
+    bot.register_chat_handler(ChatHandler(bot))
+    return bot
 
-# Register NLP chat handler
-bot.register_chat_handler(ChatHandler(bot))
 
-bot.run(DISCORD_TOKEN)
+# Required: the NLP retrain pool uses the "spawn" start method, its workers import this module as __mp_main__ and must
+# not create and run a second bot
+if __name__ == "__main__":
+    print("Hello (happy) world!")
+    create_bot().run(DISCORD_TOKEN)
@@ -1,9 +1,18 @@
 # Built-in imports
+import asyncio
 from threading import Thread
 import time
 
 # Project imports
 from src.data import settings, emojis
+from src.utils.cache_util import RenderCache
+from src.utils.command_registry import CommandRegistry
+from src.utils.dispatcher import CommandDispatcher
+from src.utils.loop_monitor import LoopMonitor
+from src.utils.message_pipeline import MessageContext, MessagePipeline
+from src.utils.rate_limit_util import RateLimiter
+from src.utils.reaction_registry import ReactionRegistry
+from src.utils.single_flight_util import SingleFlight
 import src.utils.log_util as log
 
 # External imports
@@ -18,15 +27,45 @@ class BotClient(discord.Client):
         log.info("Initializing bot...")
         super().__init__(**options)
 
-        # Command handlers
-        self.command_handlers = []
+        # Start-up timing, app.py overrides boot_time with the time before its imports
+        self.boot_time = time.monotonic()
+        self.online_time = None
+        # Event loop lag, started once the bot is online
+        self.loop_monitor = LoopMonitor(settings.LOOP_MONITOR_INTERVAL, settings.LOOP_LAG_WARNING, settings.LOOP_DEBUG, settings.LOOP_SLOW_CALLBACK)
+
+        # Command handlers, indexed by command and alias
+        self.command_handlers = CommandRegistry(settings.COMMAND_CASE_INSENSITIVE, settings.COMMAND_PREFIX_MATCHING)
+        # Help and intent embeds, see RenderCache
+        self.embed_cache = RenderCache()
         # Intent handlers { intent => handler }
         self.intent_handlers = {}
-        # Dynamically-registered reaction handlers
-        self.reaction_handlers = []
+        # Dynamically-registered reaction handlers, indexed by message and timed out in the background
+        self.reaction_handlers = ReactionRegistry()
         # Chat handler
         self.chat_handler = None
         self.chat_enabled = False
+        # Token buckets of every command and of the chat interface
+        self.rate_limiter = RateLimiter()
+
+        # Typing indicators { channel id => pending typing task } and { channel id => monotonic time it stays visible until }
+        self.typing_tasks = {}
+        self.typing_until = {}
+
+        # Identical concurrent requests share one computation, see SingleFlight
+        self.single_flight = SingleFlight()
+
+        # Command handlers run as tasks, bounded overall and per guild
+        self.dispatcher = CommandDispatcher(settings.DISPATCH_MAX_CONCURRENCY, settings.DISPATCH_QUEUE_SIZE)
+
+        # Stages of on_message, command modules can register their own in between (see register_stage)
+        self.pipeline = MessagePipeline()
+        self.register_stage("ignore_bots", self.stage_ignore_bots, 100)
+        self.register_stage("whitelist", self.stage_whitelist, 200)
+        self.register_stage("chat", self.stage_chat, 300)
+        self.register_stage("parse", self.stage_parse, 400)
+        self.register_stage("lookup", self.stage_lookup, 500)
+        self.register_stage("rate_limit", self.stage_rate_limit, 600)
+        self.register_stage("dispatch", self.stage_dispatch, 700)
 
         log.info("Initialization complete!")
 
@@ -37,54 +76,21 @@ class BotClient(discord.Client):
     async def on_ready(self):
         """ Called when the Discord bot is online, sets bot status """
         log.info(f"Bot is online! Hello (happy) world from {self.user}!")
+        # on_ready fires again after reconnects, only the first one counts
+        if self.online_time is None:
+            self.online_time = time.monotonic() - self.boot_time
+            log.info(f"Time to online: {self.online_time:.2f}s")
+            self.loop_monitor.start()
         await self.change_presence(activity=discord.Activity(name="with One", type=1))
 
     async def on_message(self, message):
         """
-        Main method for handling messages and commands
+        Main method for handling messages and commands, runs the message through the pipeline stages (see register_stage)
 
         Args:
             message (discord.Message): incoming message (tracks all messages sent to channels)
         """
-        channel = message.channel
-        author = message.author
-        # Ignore messages sent by bots
-        if author.bot:
-            return
-        # Check if server or channel is whitelisted or DMs
-        if channel.id not in settings.ENABLED_CHANNELS and message.guild.id not in settings.ENABLED_SERVERS and not isinstance(channel, discord.DMChannel):
-            return
-        # Prefix test
-        if len(message.content) <= len(settings.BOT_PREFIX) or not message.content.startswith(settings.BOT_PREFIX):
-            # Test if chat is enabled
-            if self.chat_enabled:
-                # Handle NLP
-                await self.chat_handler.on_message(author, message, channel, message.guild)
-                log.info(f"Chat message \"{message.content}\" received from {author.display_name}#{author.discriminator}!")
-            return
-
-        # Parse data
-        info = message.content[len(settings.BOT_PREFIX):].split()
-        command = info[0]
-        args = info[1:]
-
-        # Log
-        log.info(f"Command \"{message.content}\" received from {author.display_name}#{author.discriminator}!")
-
-        # Find command handler in registered handlers
-        handler = None
-        for loop in self.command_handlers:
-            if command == loop.command or command in loop.aliases:
-                handler = loop
-                break
-
-        # Not found -- unknown command
-        if handler is None:
-            await self.react_unknown(message)
-            return
-
-        # Found -- fire handler
-        await handler.on_command(message.author, command, args, message, channel, message.guild)
+        await self.pipeline.run(MessageContext(message))
 
     async def on_reaction_add(self, reaction, user):
         """
@@ -106,43 +112,115 @@ class BotClient(discord.Client):
         message = reaction.message
         emoji = reaction.emoji  # any of {Emoji, str}
 
-        # Find reaction handler in registered handlers
-        for a in range(len(self.reaction_handlers) - 1, 0 - 1, -1):
-            handler = self.reaction_handlers[a]
-
-            # Check if the reaction has expired
-            if time.time() > handler.expire_time:
-                # Fire on_timeout
-                await handler.on_timeout()
-                del self.reaction_handlers[a]
-                continue
+        # Find reaction handler in registered handlers, expired ones are timed out by the registry
+        handler = self.reaction_handlers.pop(message.id, emoji)
+        if handler is None:
+            return
 
-            # Match message and reaction(s)
-            if message != handler.message or emoji not in handler.emojis:
-                continue
+        # Correct handler, fire on_react
+        await handler.on_react(user, emoji)
 
-            # Correct handler, fire on_react
-            await handler.on_react(user, emoji)
-            del self.reaction_handlers[a]
+        # Log
+        log.info(f"Reaction \"{emoji}\" added by {user.display_name}#{user.discriminator} on \"{message.content}\"!")
+
+    ###########################
+    # MESSAGE PIPELINE STAGES #
+    ###########################
+    # Each stage returns whether the message goes on to the next stage
+
+    async def stage_ignore_bots(self, context):
+        """ Ignore messages sent by bots """
+        return not context.author.bot
+
+    async def stage_whitelist(self, context):
+        """ Check if server or channel is whitelisted or DMs """
+        return (context.channel.id in settings.ENABLED_CHANNELS or isinstance(context.channel, discord.DMChannel)
+                or context.guild.id in settings.ENABLED_SERVERS)
+
+    async def stage_chat(self, context):
+        """ Prefix test, anything that is not a command goes to the NLP chat interface (if enabled) """
+        message, author = context.message, context.author
+        if len(message.content) > len(settings.BOT_PREFIX) and message.content.startswith(settings.BOT_PREFIX):
+            return True
+        # Test if chat is enabled, floods are ignored before they reach inference
+        if self.chat_enabled and not self.rate_limiter.acquire("chat", settings.CHAT_RATE_LIMITS, author, context.channel, context.guild):
+            # Handle NLP
+            await self.pipeline.run_handler("<chat>", self.chat_handler.on_message(author, message, context.channel, context.guild))
+            log.info(f"Chat message \"{message.content}\" received from {author.display_name}#{author.discriminator}!")
+        return False
+
+    async def stage_parse(self, context):
+        """ Split the command and its arguments """
+        info = context.message.content[len(settings.BOT_PREFIX):].split()
+        if not info:
+            return False
+        context.command, context.args = info[0], info[1:]
 
-            # Log
-            log.info(f"Reaction \"{emoji}\" added by {user.display_name}#{user.discriminator} on \"{message.content}\"!")
+        # Log
+        log.info(f"Command \"{context.message.content}\" received from {context.author.display_name}#{context.author.discriminator}!")
+        return True
 
-            # We're done here, return out of this method
-            return
+    async def stage_lookup(self, context):
+        """ Find command handler in registered handlers """
+        context.handler = self.command_handlers.get(context.command)
+        # Not found -- unknown command
+        if context.handler is None:
+            await self.react_unknown(context.message)
+            return False
+        return True
+
+    async def stage_rate_limit(self, context):
+        """ Throttled -- cheap reaction instead of running the handler """
+        author = context.author
+        if self.rate_limiter.acquire(context.handler.command, context.handler.rate_limits, author, context.channel, context.guild):
+            log.info(f"Command \"{context.command}\" from {author.display_name}#{author.discriminator} is rate limited")
+            await context.message.add_reaction(emojis.HOUR_GLASS)
+            return False
+        return True
+
+    async def stage_dispatch(self, context):
+        """ Found -- queue the handler, it runs as its own task once its guild gets a turn """
+        handler = context.handler
+
+        def run():
+            return self.pipeline.run_handler(handler.command, handler.on_command(context.author, context.command, context.args,
+                                                                                 context.message, context.channel, context.guild))
+
+        # DMs take turns per channel
+        key = context.guild.id if context.guild is not None else context.channel.id
+        if not self.dispatcher.submit(key, handler.command, run):
+            # Overloaded -- this guild already has a full queue
+            log.warning(f"Command \"{context.command}\" from {context.author.display_name}#{context.author.discriminator} rejected, queue is full")
+            await context.message.add_reaction(emojis.HOUR_GLASS)
+            return False
+        return True
 
     ####################
     # LOGISTIC METHODS #
     ####################
 
+    def register_stage(self, name, stage, priority):
+        """
+        Register an on_message stage, built-in stages use priorities 100 (ignore bots) to 700 (dispatch) by steps of 100
+
+        Args:
+            name (str): stage name, as reported in the latency histograms
+            stage (Callable[[MessageContext], Awaitable[bool]]): async stage, returns False to stop processing the message
+            priority (int): stages run by increasing priority
+        """
+        self.pipeline.register(name, stage, priority)
+
     def register_command_handler(self, handler):
         """
         Register a command handler to the bot, only need to do this once
+        - raises ValueError if its command or one of its aliases is already taken
 
         Args:
             handler (CommandHandler): command handler
         """
-        self.command_handlers.append(handler)
+        self.command_handlers.register(handler)
+        # Render its help right away, requests only look it up
+        handler.get_help_embedded()
 
     def register_intent_handler(self, intent, handler):
         """
@@ -157,11 +235,12 @@ class BotClient(discord.Client):
     def register_reaction_handler(self, handler):
         """
         Register a dynamic reaction handler to the bot, do this every time when listening to bot reactions
+        - on_timeout fires when it expires, whether or not other reactions come in
 
         Args:
             handler (ReactionHandler): reaction handler
         """
-        self.reaction_handlers.append(handler)
+        self.reaction_handlers.register(handler)
 
     def register_chat_handler(self, handler):
         """
@@ -176,23 +255,50 @@ class BotClient(discord.Client):
     # EXPRESS ACTION METHODS #
     ##########################
 
-    @staticmethod
-    async def send_typing_packet(channel):
+    async def send_typing_packet(self, channel):
         """
-        Send the "XXX is typing..." packet to the specified channel
+        Send the "XXX is typing..." packet to the specified channel, returns right away
+        - skipped if a reply is sent within TYPING_DELAY, or if the channel already shows the bot typing
 
         Args:
             channel (discord.TextChannel): channel to send to
         """
-        await channel.trigger_typing()
-
-    @staticmethod
-    async def reply(reference, content=None, embedded=None, channel=None):
+        if channel.id in self.typing_tasks or time.monotonic() < self.typing_until.get(channel.id, 0):
+            return
+        self.typing_tasks[channel.id] = asyncio.ensure_future(self._send_typing_packet(channel))
+
+    async def _send_typing_packet(self, channel):
+        # Cancelled by reply if it comes first
+        await asyncio.sleep(settings.TYPING_DELAY)
+        del self.typing_tasks[channel.id]
+        self.typing_until[channel.id] = time.monotonic() + settings.TYPING_WINDOW
+        try:
+            await channel.trigger_typing()
+        except discord.HTTPException as e:
+            log.warning(f"Failed to send typing packet to {channel}: {e}")
+
+    async def reply(self, reference, content=None, embedded=None, channel=None):
         assert any([content, embedded]), "Must reply with one or more of {content (string), embedded (embedded message)}!"
         if channel is None:
             channel = reference.channel
+        # The reply makes a pending typing indicator pointless, and clears a visible one
+        typing_task = self.typing_tasks.pop(channel.id, None)
+        if typing_task is not None:
+            typing_task.cancel()
+        self.typing_until.pop(channel.id, None)
         return await channel.send(content=content, embed=embedded, reference=reference, mention_author=False)
 
+    @staticmethod
+    async def add_reactions(message, *emotes):
+        """
+        Add several reactions at once, in one round trip time instead of one each (their order is not guaranteed)
+
+        Args:
+            message (discord.Message): message to react to
+            emotes (Union[discord.Emoji, str]): reaction emotes
+        """
+        await asyncio.gather(*(message.add_reaction(emote) for emote in emotes))
+
     @staticmethod
     async def react_unknown(message):
         await message.add_reaction(emojis.QUESTION)
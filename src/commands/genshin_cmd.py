@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 
 import discord, pytz
@@ -18,6 +19,8 @@ class MineCommandHandler(CommandHandler, IntentHandler):
                                 f"> {settings.BOT_PREFIX}mine list")
         # Initialize intent handler superclass
         IntentHandler.__init__(self, bot, "genshin_mine", "Check whose Genshin Impact world is ready to be mined")
+        # Every operation hits the database
+        self.rate_limits = [("user", 3, 30), ("guild", 10, 30)]
 
     async def on_command(self, author, command, args, message, channel, guild):
         if len(args) < 1:
@@ -27,20 +30,22 @@ class MineCommandHandler(CommandHandler, IntentHandler):
         operation = args[0]
         if operation == "list" or operation == "l":
             await self.bot.send_typing_packet(channel)
-            await self.bot.reply(message, embedded=get_mine_list_embedded(get_worlds()))
+            await self.bot.reply(message, embedded=await self.get_mine_list())
         elif operation == "update" or operation == "u":
             if len(args) < 2:
                 await self.bot.reply(message, content=f"Invalid arguments! Usage: `{settings.BOT_PREFIX}mine update <name>`")
                 return
-            # Update mine
-            update(args[1])
+            # Update mine off the event loop, lists requested from now on must see it
+            await asyncio.get_event_loop().run_in_executor(None, update, args[1])
+            self.bot.single_flight.forget(("mine_list",))
             await self.bot.react_check(message)
         elif operation == "delete" or operation == "d":
             if len(args) < 2:
                 await self.bot.reply(message, content=f"Invalid arguments! Usage: `{settings.BOT_PREFIX}mine delete <existing name>`")
                 return
-            # Delete mine entry
-            row_count = delete(args[1])
+            # Delete mine entry off the event loop
+            row_count = await asyncio.get_event_loop().run_in_executor(None, delete, args[1])
+            self.bot.single_flight.forget(("mine_list",))
             await self.bot.reply(message, content=f"Operation successful, {row_count} rows affected")
         else:
             await message.add_reaction(emojis.QUESTION)
@@ -48,7 +53,15 @@ class MineCommandHandler(CommandHandler, IntentHandler):
 
     async def on_intent_detected(self, author, confidence, message, channel, guild):
         await self.bot.send_typing_packet(channel)
-        return await self.bot.reply(message, embedded=get_mine_list_embedded(get_worlds()))
+        return await self.bot.reply(message, embedded=await self.get_mine_list())
+
+    async def get_mine_list(self):
+        """ Query the worlds off the event loop, concurrent lists (commands and intents alike) share one query and embed """
+        async def build():
+            worlds = await asyncio.get_event_loop().run_in_executor(None, get_worlds)
+            return get_mine_list_embedded(worlds)
+
+        return await self.bot.single_flight.do(("mine_list",), build)
 
 
 def get_mine_list_embedded(worlds):
@@ -1,4 +1,4 @@
-from threading import Timer
+import asyncio
 
 import discord
 
@@ -12,22 +12,29 @@ from src.utils.command_handler import CommandHandler
 class ToggleCommandHandler(CommandHandler):
     def __init__(self, bot):
         super().__init__(bot, "toggle", ["t"], "Toggle my NLP chat interface", "", "")
+        # Pending auto-disable, replaced by every toggle
+        self.disable_handle = None
 
     async def on_command(self, author, command, args, message, channel, guild):
+        # Load the NLP model on first use, unless inference runs in the sidecar
+        if self.bot.chat_handler.client is None and not self.bot.chat_handler.nlp_ready:
+            await message.add_reaction(emojis.HOUR_GLASS)
+            await self.bot.chat_handler.initialize_nlp()
         self.bot.chat_enabled = True
         emote = emojis.UNMUTE if self.bot.chat_enabled else emojis.MUTE
         await message.add_reaction(emote)
         status = "enabled" if self.bot.chat_enabled else "disabled"
         log.info(f"NLP chat interface is now {status}")
 
-        # Disable after 3 minutes
+        # Disable after 3 minutes, on the event loop rather than a timer thread
         def disable_chat():
             self.bot.chat_enabled = False
             status = "enabled" if self.bot.chat_enabled else "disabled"
             log.info(f"[AUTO] NLP chat interface is now {status}")
 
-        t = Timer(3 * 60, disable_chat)
-        t.start()
+        if self.disable_handle is not None:
+            self.disable_handle.cancel()
+        self.disable_handle = asyncio.get_event_loop().call_later(3 * 60, disable_chat)
 
 
 class IntentCommandHandler(CommandHandler):
@@ -43,6 +50,9 @@ class IntentCommandHandler(CommandHandler):
             await self.bot.reply(message, content=f"Invalid arguments! Check out `{settings.BOT_PREFIX}help intent`")
             return
 
+        # Load the intents on first use
+        await self.bot.chat_handler.initialize_intents()
+
         operation = args[0]
         if operation == "info" or operation == "i":
             if len(args) < 2:
@@ -66,7 +76,15 @@ class IntentCommandHandler(CommandHandler):
     ###############################
 
     @staticmethod
-    def get_intent_info_embedded(intent):
+    def get_model_version():
+        """ State the intent embeds are rendered from: the published model (with its intents) and whether it is outdated """
+        return primitive_model.serving[0], primitive_model.model_changed
+
+    def get_intent_info_embedded(self, intent):
+        return self.bot.embed_cache.get(("intent_info", intent), self.get_model_version(), lambda: self.render_intent_info_embedded(intent))
+
+    @staticmethod
+    def render_intent_info_embedded(intent):
         embedded = discord.Embed(
             title=f"Information about intent \"{intent}\"",
             description=f"There is currently a total of **{len(primitive_model.utterances[intent])}** utterances for \"{intent}\"",
@@ -74,7 +92,7 @@ class IntentCommandHandler(CommandHandler):
         )
         embedded.add_field(name="**Utterances:**", value=f"> {string_util.quote_join(primitive_model.utterances[intent])}", inline=False)
         if primitive_model.model_changed:
-            embedded.set_footer(text="* there are some pending changes to the model, reload to see them in action")
+            embedded.set_footer(text="* there are some pending changes to the model, they will be live once retraining is done")
         return embedded
 
     @staticmethod
@@ -85,11 +103,14 @@ class IntentCommandHandler(CommandHandler):
             color=colors.COLOR_NLP
         )
         if primitive_model.model_changed:
-            embedded.set_footer(text="* there are some pending changes to the model, reload to see them in action")
+            embedded.set_footer(text="* there are some pending changes to the model, they will be live once retraining is done")
         return embedded
 
+    def get_intent_list_embedded(self):
+        return self.bot.embed_cache.get(("intent_list",), self.get_model_version(), self.render_intent_list_embedded)
+
     @staticmethod
-    def get_intent_list_embedded():
+    def render_intent_list_embedded():
         embedded = discord.Embed(
             title=f"List of intents in my NLP module",
             description=f"There is currently a total of **{len(primitive_model.intents)}** intents",
@@ -97,7 +118,7 @@ class IntentCommandHandler(CommandHandler):
         )
         embedded.add_field(name="**Intents:**", value=f"> {settings.SEP.join(primitive_model.intents)}", inline=False)
         if primitive_model.model_changed:
-            embedded.set_footer(text="* there are some pending changes to the model, reload to see them in action")
+            embedded.set_footer(text="* there are some pending changes to the model, they will be live once retraining is done")
         return embedded
 
 
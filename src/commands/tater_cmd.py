@@ -4,6 +4,7 @@ import time
 # Project imports
 from src.utils import time_util, MoveMessageUtil
 from src.utils.command_handler import CommandHandler
+from src.utils.rate_limit_util import TokenBuckets
 from src.data import colors, settings, emojis
 
 # External imports
@@ -13,7 +14,8 @@ import discord
 class DmReportCommandHandler(CommandHandler):
     def __init__(self, bot):
         super().__init__(bot, "report", ["vent"], "[DM Only] Report something to the moderators in AaH Discord", f"{settings.BOT_PREFIX}report [message...]", f"{settings.BOT_PREFIX}report I ate too many strawberries!")
-        self.cooldowns = {}
+        # One report per user per hour, idle users are evicted
+        self.cooldowns = TokenBuckets(1, 60 * 60)
 
     async def on_command(self, author, command, args, message, channel, guild):
         # DM-only command
@@ -27,15 +29,16 @@ class DmReportCommandHandler(CommandHandler):
             return
 
         # Check cooldowns
-        if self.cooldowns.get(author.id, -1) > time.time():
+        wait = self.cooldowns.wait_time(author.id)
+        if wait > 0:
             # In cooldown, send "wait" message
-            await self.bot.reply(message, content=f"This command should not be spammed. You need to wait {time_util.format_time(self.cooldowns[author.id] - time.time(), english=True)} before reporting again!")
+            await self.bot.reply(message, content=f"This command should not be spammed. You need to wait {time_util.format_time(wait, english=True)} before reporting again!")
             return
         # Not in cooldown, reset cooldown
-        self.cooldowns[author.id] = time.time() + 60 * 60
+        self.cooldowns.consume(author.id)
 
         # Trigger typing
-        await channel.trigger_typing()
+        await self.bot.send_typing_packet(channel)
 
         # Generate message embedded
         embedded = MoveMessageUtil.generate_embedded(message.author, message.content, message.attachments, is_dm=True)
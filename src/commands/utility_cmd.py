@@ -1,4 +1,5 @@
 # Project imports
+from src.nlp import primitive_model
 from src.utils.command_handler import CommandHandler
 from src.data import colors, settings, emojis
 
@@ -17,11 +18,7 @@ class HelpCommandHandler(CommandHandler):
         # Help for specific command
         elif len(args) == 1:
             # Find target command
-            handler = None
-            for loop in self.bot.command_handlers:
-                if args[0] == loop.command or args[0] in loop.aliases:
-                    handler = loop
-                    break
+            handler = self.bot.command_handlers.get(args[0])
 
             # Not found -- unknown command
             if handler is None:
@@ -36,6 +33,9 @@ class HelpCommandHandler(CommandHandler):
         await self.bot.reply(message, embedded=reply_embedded)
 
     def get_general_help_embedded(self):
+        return self.bot.embed_cache.get(("help",), self.bot.command_handlers.version, self.render_general_help_embedded)
+
+    def render_general_help_embedded(self):
         embedded = discord.Embed(
             title=f"List of available commands",
             description=f"Here's how to use my commands: `{settings.BOT_PREFIX}<command> [arguments...]`",
@@ -64,7 +64,73 @@ class PingCommandHandler(CommandHandler):
         super().__init__(bot, "ping", [], "Check my connection speed to the Discord server", "", "")
 
     async def on_command(self, author, command, args, message, channel, guild):
-        await self.bot.reply(message, content=f"{emojis.PING_PONG} Pong! {int(self.bot.latency * 1000)}ms")
+        lag = self.bot.loop_monitor.lag
+        await self.bot.reply(message, content=f"{emojis.PING_PONG} Pong! {int(self.bot.latency * 1000)}ms "
+                                              f"(event loop lag p50 {lag.percentile(50) * 1000:.0f}ms, p99 {lag.percentile(99) * 1000:.0f}ms, "
+                                              f"max {lag.max * 1000:.0f}ms)")
+
+
+class StatsCommandHandler(CommandHandler):
+    def __init__(self, bot):
+        super().__init__(bot, "stats", ["perf"], "Show where my time goes when handling messages", "", "")
+
+    async def on_command(self, author, command, args, message, channel, guild):
+        await self.bot.reply(message, embedded=self.get_stats_embedded())
+
+    def get_stats_embedded(self):
+        pipeline = self.bot.pipeline
+        embedded = discord.Embed(
+            title=f"Message handling statistics",
+            description=f"Latency percentiles (p50 / p95 / max) since I came online",
+            color=colors.COLOR_HELP
+        )
+        stages = [f"`{name}`: {format_histogram(pipeline.stage_latency[name])}" for _, _, name, _ in pipeline.stages if name in pipeline.stage_latency]
+        embedded.add_field(name="**Stages:**", value="\n".join(stages) or "None", inline=False)
+
+        # Slowest handlers first, with the CPU time they spent themselves
+        names = sorted(pipeline.handler_latency, key=lambda name: pipeline.handler_latency[name].percentile(95), reverse=True)[:10]
+        handlers = [f"`{name}`: {format_histogram(pipeline.handler_latency[name])}, CPU p95 {pipeline.handler_cpu[name].percentile(95) * 1000:.1f}ms"
+                    for name in names]
+        embedded.add_field(name="**Handlers:**", value="\n".join(handlers) or "None", inline=False)
+
+        chat_handler = self.bot.chat_handler
+        if chat_handler is not None:
+            # Where chat messages stopped, most are filtered out before (or by) the model
+            counts = [f"`{stage}`: {count}" for stage, count in chat_handler.stage_counts.items()]
+            embedded.add_field(name="**Chat messages:**", value=", ".join(counts), inline=False)
+
+        index = primitive_model.serving[4]
+        if index is not None:
+            embedded.add_field(name="**Utterance index:**", inline=False,
+                               value=f"Answered {index.served_ratio * 100:.1f}% of {index.counts['lookup']} messages without the model")
+
+        cache = primitive_model.prediction_cache
+        embedded.add_field(name="**Prediction cache:**", inline=False,
+                           value=f"{cache.hits} hits, {cache.misses} misses ({cache.hit_rate() * 100:.1f}%), {len(cache)}/{cache.max_size} entries")
+
+        single_flight = self.bot.single_flight
+        coalesced = [f"`{operation}`: {single_flight.coalesced_counts[operation]} of {count} calls coalesced" for operation, count in single_flight.call_counts.most_common()]
+        embedded.add_field(name="**Single flight:**", value="\n".join(coalesced) or "None", inline=False)
+
+        dispatcher = self.bot.dispatcher
+        embedded.add_field(name="**Dispatcher:**", inline=False,
+                           value=f"{len(dispatcher.tasks)}/{dispatcher.max_concurrency} running, {dispatcher.queued_count} queued "
+                                 f"(peak {dispatcher.peak_queued_count}), {dispatcher.rejected_count} rejected\n"
+                                 f"Queue wait: {format_histogram(dispatcher.wait_time)}")
+        reactions = self.bot.reaction_handlers
+        embedded.add_field(name="**Reaction handlers:**", inline=False,
+                           value=f"{len(reactions)} pending, {reactions.react_count} reacted, {reactions.timeout_count} timed out\n"
+                                 f"Sweep lag: avg {reactions.sweep_lag_average * 1000:.1f}ms, max {reactions.sweep_lag_max * 1000:.1f}ms")
+        rate_limiter = self.bot.rate_limiter
+        embedded.add_field(name="**Rate limiter:**", inline=False,
+                           value=f"{rate_limiter.allowed_count} allowed, {rate_limiter.rejected_count} rejected, {len(rate_limiter)} live buckets")
+        embedded.add_field(name="**Event loop lag:**", value=format_histogram(self.bot.loop_monitor.lag), inline=False)
+        return embedded
+
+
+def format_histogram(histogram):
+    return (f"{histogram.percentile(50) * 1000:.1f} / {histogram.percentile(95) * 1000:.1f} / {histogram.max * 1000:.1f}ms "
+            f"({histogram.count})")
 
 
 class TestCommandHandler(CommandHandler):
@@ -81,4 +147,5 @@ def register_all(bot):
     """ Register all commands in this module """
     bot.register_command_handler(HelpCommandHandler(bot))
     bot.register_command_handler(PingCommandHandler(bot))
+    bot.register_command_handler(StatsCommandHandler(bot))
     bot.register_command_handler(TestCommandHandler(bot))
@@ -7,6 +7,40 @@ SEP = ", "
 VERBOSE_LEVEL = 0
 STDERR_LEVEL = 5
 
+# Command matching, both default to exact matching
+# - whether "/Help" runs "/help" (commands or aliases differing only by case are then rejected at registration)
+COMMAND_CASE_INSENSITIVE = False
+# - whether an unambiguous prefix of a command or alias runs it, e.g. "/he" => "/help"
+COMMAND_PREFIX_MATCHING = False
+
+# Rate limits, [(scope, capacity, period)...]: "user", "channel" or "guild" can send up to capacity requests at once,
+# then capacity per period (in seconds), rejected commands get an hourglass reaction
+# - default of every command, handlers can declare their own
+COMMAND_RATE_LIMITS = [("user", 5, 10)]
+# - NLP chat messages (run model inference), rejected messages are ignored
+CHAT_RATE_LIMITS = [("user", 6, 60), ("channel", 20, 60)]
+
+# Command handlers run as tasks
+# - maximum number of handlers running at once (over every guild)
+DISPATCH_MAX_CONCURRENCY = 16
+# - maximum number of handlers waiting per guild, guilds take turns and commands beyond this get an hourglass reaction
+DISPATCH_QUEUE_SIZE = 8
+
+# Event loop monitor, in seconds
+# - how often the loop lag is measured
+LOOP_MONITOR_INTERVAL = 0.5
+# - lag that gets logged as a warning
+LOOP_LAG_WARNING = 0.25
+# - debug mode: asyncio logs callbacks slower than LOOP_SLOW_CALLBACK, and the stack of whatever blocks the loop is logged
+LOOP_DEBUG = False
+LOOP_SLOW_CALLBACK = 0.1
+
+# Typing indicator ("Base is typing..."), in seconds
+# - only sent if the reply takes longer than this
+TYPING_DELAY = 0.5
+# - how long Discord shows it, it is not sent again to the same channel meanwhile
+TYPING_WINDOW = 9
+
 ############################
 # SCHEDULER CONFIGURATIONS #
 ############################
@@ -37,3 +71,65 @@ ENABLED_CHANNELS = {
 # NLP CONFIGURATIONS #
 ######################
 NLP_CONFIDENCE_THRESHOLD = 0.9
+
+# Training corpus, either the intents file or a JSON Lines file of {"intent": ..., "utterance": ...} (".jsonl", for large corpora)
+NLP_CORPUS_PATH = "src/nlp/intents.json"
+
+# Tokenizer used to preprocess messages, changing it invalidates the cached model
+# - "regex": built-in compiled regex tokenizer (fast, no extra data)
+# - "nltk": nltk.word_tokenize, needs the punkt data to be installed (falls back to "regex" otherwise)
+NLP_TOKENIZER = "regex"
+
+# Network hyperparameters, changing any of these invalidates the cached model
+NLP_HIDDEN_LAYERS = [8, 8]
+NLP_EPOCHS = 1000
+NLP_BATCH_SIZE = 8
+
+# Training data is densified at most this many utterances at a time (larger corpora are trained chunk by chunk)
+NLP_TRAIN_CHUNK_SIZE = 4096
+
+# Model used to serve predictions
+# - "numpy": exported weights, no tensorflow at serve time
+# - "tflearn": the tflearn model itself
+NLP_INFERENCE_BACKEND = "numpy"
+
+# Storage type of the exported weights served by the "numpy" backend
+# - "float32": as trained
+# - "float16" / "int8": smaller files and resident weights, but slower inference (they are cast back to float32 on every
+#   forward pass), only used if no utterance of the intents file fires a different intent
+NLP_WEIGHT_PRECISION = "float32"
+
+# Chat messages are classified in batches on a worker thread
+# - how many messages can wait for inference before new ones are dropped
+NLP_INFERENCE_QUEUE_SIZE = 64
+# - maximum number of messages per forward pass
+NLP_INFERENCE_BATCH_SIZE = 16
+# - how long to wait for more messages to join a batch (in seconds)
+NLP_INFERENCE_BATCH_WAIT = 0.005
+
+# Recent predictions are cached by their bag-of-words
+# - maximum number of cached predictions
+NLP_CACHE_SIZE = 1024
+# - how long a cached prediction stays valid (in seconds)
+NLP_CACHE_TTL = 10 * 60
+
+# Messages sharing less than this ratio of tokens with the NLP vocabulary are ignored without running the model
+NLP_MIN_OVERLAP_RATIO = 0.2
+
+# Messages whose character trigrams are more similar than this to a training utterance get its intent without running the model
+# - 1 only answers exact repeats (ignoring case, punctuation and spacing), None disables the fast path
+NLP_INDEX_THRESHOLD = 0.75
+# - trigrams found in more utterances than this are not used to find candidates, and at most NLP_INDEX_CANDIDATES
+#   candidates are compared, so that a lookup costs the same whatever the size of the corpus
+NLP_INDEX_MAX_POSTINGS = 500
+NLP_INDEX_CANDIDATES = 20
+
+# Optional inference sidecar (src/nlp/inference_server.py) shared by every bot process on the host
+# - Unix socket path of the sidecar, None to always run inference in-process
+NLP_SIDECAR_SOCKET = None
+# - seconds to wait for a prediction before falling back to in-process inference
+NLP_SIDECAR_TIMEOUT = 2
+# - seconds to wait before trying to reconnect to a sidecar that is down
+NLP_SIDECAR_RETRY_INTERVAL = 30
+# - how often the sidecar checks for a retrained model on disk (in seconds)
+NLP_SIDECAR_RELOAD_INTERVAL = 30
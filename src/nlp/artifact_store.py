@@ -0,0 +1,203 @@
+import json
+import os
+
+import numpy as np
+
+# Bump this whenever the layout below changes, older artifacts are then ignored (and regenerated)
+ARTIFACT_VERSION = 1
+
+# Artifact layout, one directory:
+# - header.json:     {"version", "dictionary", "intents", "rows", "nnz"}, everything inference needs
+# - utterances.json: {intent => [utterances...]}, only read when someone asks for them
+# - indptr.npy:      int64[rows + 1], row i of the training data is indices[indptr[i]:indptr[i + 1]]
+# - indices.npy:     int32[nnz], dictionary indices of the 1's in the bag-of-words of each row
+# - labels.npy:      int32[rows], intent index of each row
+FILE_HEADER = "header.json"
+FILE_UTTERANCES = "utterances.json"
+FILE_INDPTR = "indptr.npy"
+FILE_INDICES = "indices.npy"
+FILE_LABELS = "labels.npy"
+
+
+class SparseRows:
+    """ Read-only sparse 0/1 matrix in CSR layout, each row is the array of column indices of its 1's """
+
+    def __init__(self, indptr, indices):
+        """
+        Construct from CSR arrays (can be memory-mapped)
+
+        Args:
+            indptr (np.array): row offsets into indices, length = number of rows + 1
+            indices (np.array): column indices of every row, concatenated
+        """
+        self.indptr = indptr
+        self.indices = indices
+
+    @staticmethod
+    def from_lists(rows):
+        """
+        Build from a list of index lists
+
+        Args:
+            rows (List[List[int]]): column indices of each row
+
+        Returns:
+            SparseRows: sparse matrix
+        """
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(row) for row in rows])
+        indices = np.fromiter((index for row in rows for index in row), dtype=np.int32, count=int(indptr[-1]))
+        return SparseRows(indptr, indices)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[a] for a in range(*i.indices(len(self)))]
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __str__(self):
+        return f"Sparse rows ({len(self)} rows, {len(self.indices)} non-zeros)"
+
+
+class LazyUtterances(dict):
+    """ Dict of {intent => [utterances...]} that is only read from disk on first access """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.loaded = False
+
+    def _load(self):
+        if self.loaded:
+            return
+        with open(self.path) as f:
+            self.update(json.load(f))
+        self.loaded = True
+
+    def __getitem__(self, key):
+        self._load()
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self._load()
+        return super().__contains__(key)
+
+    def __iter__(self):
+        self._load()
+        return super().__iter__()
+
+    def __len__(self):
+        self._load()
+        return super().__len__()
+
+    def __reduce__(self):
+        # Pickle (e.g. across processes) as the plain dict
+        self._load()
+        return dict, (dict(self),)
+
+    def get(self, key, default=None):
+        self._load()
+        return super().get(key, default)
+
+    def items(self):
+        self._load()
+        return super().items()
+
+    def keys(self):
+        self._load()
+        return super().keys()
+
+    def values(self):
+        self._load()
+        return super().values()
+
+
+def save(path, dictionary, intents, utterances, train_x, train_y):
+    """
+    Save the bag-of-words data, the header is written last so a half-written artifact never looks valid
+
+    Args:
+        path (str): artifact directory
+        dictionary (List[str]): sorted dictionary
+        intents (List[str]): list of intents
+        utterances (Dict[str, List[str]]): dict of {intent => [utterances...]}
+        train_x (Union[SparseRows, List[List[int]]]): sparse training data
+        train_y (Iterable[int]): intent index of each row
+    """
+    os.makedirs(path, exist_ok=True)
+    if not isinstance(train_x, SparseRows):
+        train_x = SparseRows.from_lists(train_x)
+
+    # Invalidate the old artifact first
+    if os.path.isfile(os.path.join(path, FILE_HEADER)):
+        os.remove(os.path.join(path, FILE_HEADER))
+
+    _write_array(os.path.join(path, FILE_INDPTR), np.asarray(train_x.indptr, dtype=np.int64))
+    _write_array(os.path.join(path, FILE_INDICES), np.asarray(train_x.indices, dtype=np.int32))
+    _write_array(os.path.join(path, FILE_LABELS), np.asarray(train_y, dtype=np.int32))
+    _write_json(os.path.join(path, FILE_UTTERANCES), dict(utterances))
+    _write_json(os.path.join(path, FILE_HEADER), {
+        "version": ARTIFACT_VERSION,
+        "dictionary": list(dictionary),
+        "intents": list(intents),
+        "rows": len(train_x),
+        "nnz": len(train_x.indices)
+    })
+
+
+def load(path):
+    """
+    Load the bag-of-words data, the training arrays are memory-mapped and the utterances are read lazily
+
+    Args:
+        path (str): artifact directory
+
+    Returns:
+        Tuple(List[str], List[str], LazyUtterances, SparseRows, np.array): (dictionary, intents, utterances, train_x, train_y),
+            None if there is no valid artifact at the path
+    """
+    try:
+        with open(os.path.join(path, FILE_HEADER)) as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if header.get("version") != ARTIFACT_VERSION:
+        return None
+
+    # Read-only memory maps, processes loading the same artifact share the pages
+    try:
+        indptr = np.load(os.path.join(path, FILE_INDPTR), mmap_mode="r")
+        indices = np.load(os.path.join(path, FILE_INDICES), mmap_mode="r")
+        labels = np.load(os.path.join(path, FILE_LABELS), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if len(indptr) != header["rows"] + 1 or len(indices) != header["nnz"] or len(labels) != header["rows"]:
+        return None
+
+    utterances = LazyUtterances(os.path.join(path, FILE_UTTERANCES))
+    return header["dictionary"], header["intents"], utterances, SparseRows(indptr, indices), labels
+
+
+def _write_array(path, array):
+    """
+    Write an array to a temporary file and move it into place, never overwrite it in place: other processes may have
+    the old file memory-mapped, and would read the new bytes under the old shape (or crash if the file got smaller)
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(temp_path, path)
+
+
+def _write_json(path, data):
+    """ Write JSON to a temporary file and move it into place """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
@@ -0,0 +1,336 @@
+"""
+Offline micro-benchmarks for the NLP chat path, results are printed (or saved) as JSON to compare across commits
+e.g.
+    python src/nlp/benchmark.py --intents 50 --utterances 40 --vocabulary 5000 --output bench.json
+    python src/nlp/benchmark.py --skip-train --vocabulary-scaling --tokenizers
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Stabilize imports
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(current_dir, "..", ".."))  # repository root
+
+import numpy as np
+
+from src.nlp import primitive_model
+from src.nlp.numpy_model import NumpyModel
+from src.utils.cache_util import LRUCache
+import src.utils.log_util as log
+
+VOCABULARY_SIZES = [1000, 10000, 100000]
+MESSAGE_LENGTH = 8
+REPEAT = 200
+
+
+##################
+# TIMING METHODS #
+##################
+
+def time_per_call(function, repeat=REPEAT):
+    """
+    Average wall-clock time of a function call
+
+    Args:
+        function (function): function to call without arguments
+        repeat (int): number of calls to average over
+
+    Returns:
+        float: seconds per call
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def measure(function, inputs):
+    """
+    Time a function call on each input
+
+    Args:
+        function (function): function taking one input
+        inputs (List[Any]): inputs, one call each
+
+    Returns:
+        Dict[str, float]: latency percentiles (in milliseconds) and throughput (calls per second)
+    """
+    latencies = np.empty(len(inputs))
+    for i, value in enumerate(inputs):
+        start = time.perf_counter()
+        function(value)
+        latencies[i] = time.perf_counter() - start
+    return {
+        "calls": len(inputs),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "mean_ms": float(np.mean(latencies) * 1000),
+        "throughput_per_s": float(len(inputs) / np.sum(latencies)),
+    }
+
+
+def measure_once(function):
+    """
+    Time a single (long) function call
+
+    Args:
+        function (function): function to call without arguments
+
+    Returns:
+        Dict[str, float]: wall-clock seconds
+    """
+    start = time.perf_counter()
+    function()
+    return {"seconds": time.perf_counter() - start}
+
+
+####################
+# SYNTHETIC CORPUS #
+####################
+
+def generate_corpus(intent_count, utterance_count, vocabulary_size, words_per_utterance, seed=0):
+    """
+    Generate a synthetic corpus in the intents.json format
+
+    Args:
+        intent_count (int): number of intents
+        utterance_count (int): number of utterances per intent
+        vocabulary_size (int): number of distinct words to draw from
+        words_per_utterance (int): number of words in each utterance
+        seed (int): random seed, the same arguments always produce the same corpus
+
+    Returns:
+        Dict[str, Dict[str, List[str]]]: {intent => {"patterns": [utterances...]}}
+    """
+    generator = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < vocabulary_size:
+        words.add("".join(generator.choice(letters) for _ in range(generator.randint(3, 9))))
+    words = sorted(words)
+    return {
+        f"intent{a}": {"patterns": [" ".join(generator.choices(words, k=words_per_utterance)) for _ in range(utterance_count)]}
+        for a in range(intent_count)
+    }
+
+
+def use_corpus(corpus, directory):
+    """
+    Point primitive_model at a corpus in a scratch directory, nothing in the repository is overwritten
+
+    Args:
+        corpus (Dict): corpus from generate_corpus
+        directory (str): scratch directory
+    """
+    primitive_model.PATH_INTENT = os.path.join(directory, "intents.json")
+    primitive_model.PATH_WORDS_DATA = os.path.join(directory, "bag_of_words")
+    primitive_model.PATH_MODEL = os.path.join(directory, "primitive.tflearn")
+    primitive_model.PATH_WEIGHTS = os.path.join(directory, "primitive.npz")
+    primitive_model.PATH_FINGERPRINT = os.path.join(directory, "primitive.fingerprint.json")
+    with open(primitive_model.PATH_INTENT, "w") as f:
+        json.dump(corpus, f)
+
+
+def random_numpy_model(seed=0):
+    """
+    Untrained model with the network layout of the current data, a forward pass costs the same as a trained one
+
+    Args:
+        seed (int): random seed
+
+    Returns:
+        NumpyModel: randomly initialized model
+    """
+    generator = np.random.default_rng(seed)
+    sizes = [len(primitive_model.dictionary)] + list(primitive_model.get_hyperparameters()["hidden_layers"]) + [len(primitive_model.intents)]
+    weights = [generator.normal(size=(a, b)) for a, b in zip(sizes[:-1], sizes[1:])]
+    biases = [np.zeros(b) for b in sizes[1:]]
+    activations = ["linear"] * (len(sizes) - 2) + ["softmax"]
+    return NumpyModel(weights, biases, activations)
+
+
+###################
+# BENCHMARK SUITE #
+###################
+
+def run_suite(args):
+    """
+    Run the benchmark suite on a synthetic corpus
+
+    Args:
+        args (argparse.Namespace): parsed command line arguments
+
+    Returns:
+        Dict: JSON-serializable report
+    """
+    corpus = generate_corpus(args.intents, args.utterances, args.vocabulary, args.words, args.seed)
+    messages = [sentence for intent_data in corpus.values() for sentence in intent_data["patterns"]]
+    messages = random.Random(args.seed).choices(messages, k=args.samples)
+
+    directory = tempfile.mkdtemp(prefix="nlp_benchmark_")
+    results = {}
+    try:
+        use_corpus(corpus, directory)
+
+        results["generate_data"] = measure_once(lambda: primitive_model.generate_data(save_data=True))
+        results["load_data"] = measure_once(primitive_model.load_data)
+
+        if args.skip_train:
+            primitive_model.set_model(random_numpy_model(args.seed))
+        else:
+            results["create_and_train_model"] = measure_once(lambda: primitive_model.create_and_train_model(epochs=args.epochs, save_model=False))
+            primitive_model.export_weights()
+            primitive_model.load_numpy_model()
+
+        results["preprocess"] = measure(primitive_model.preprocess, messages)
+        token_lists = [primitive_model.preprocess(message) for message in messages]
+        results["bag_of_words"] = measure(primitive_model.bag_of_words, token_lists)
+
+        # The messages repeat training utterances, the utterance index would answer all of them without the model
+        # - the model is timed with the index disabled, without the prediction cache first, then with a warm one
+        serving = primitive_model.serving
+        primitive_model.serving = serving[:4] + (None,)
+        cache = primitive_model.prediction_cache
+        primitive_model.prediction_cache = LRUCache(0)
+        results["predict"] = measure(primitive_model.predict, messages)
+        primitive_model.prediction_cache = LRUCache(len(messages))
+        primitive_model.predict_batch(messages)
+        results["predict_cached"] = measure(primitive_model.predict, messages)
+
+        # - then the index fast path on its own
+        primitive_model.serving = serving
+        primitive_model.prediction_cache = LRUCache(0)
+        if serving[4] is not None:
+            results["predict_indexed"] = measure(primitive_model.predict, messages)
+        primitive_model.prediction_cache = cache
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "commit": get_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus": {
+            "intents": args.intents,
+            "utterances_per_intent": args.utterances,
+            "vocabulary": args.vocabulary,
+            "words_per_utterance": args.words,
+            "dictionary_size": len(primitive_model.dictionary),
+            "seed": args.seed,
+        },
+        "settings": {"tokenizer": primitive_model.settings.NLP_TOKENIZER, **primitive_model.get_hyperparameters()},
+        "results": results,
+    }
+
+
+def get_commit():
+    """
+    Returns:
+        str: current git commit hash, None if it can't be determined
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=current_dir, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+###############
+# COMPARISONS #
+###############
+
+def legacy_bag_of_words(tokens):
+    """ The list-comprehension bag of words that scans the whole dictionary, kept for comparison """
+    tokens = set(tokens)
+    return [1 if word in tokens else 0 for word in primitive_model.dictionary]
+
+
+def benchmark_vocabulary_scaling():
+    """ Featurization cost of a fixed-length message as the vocabulary grows """
+    print(f"{'vocabulary':>10s} | {'legacy (us)':>12s} | {'indexed (us)':>12s} | {'speed-up':>8s}", file=sys.stderr)
+    for size in VOCABULARY_SIZES:
+        primitive_model.dictionary = sorted(f"token{a}" for a in range(size))
+        primitive_model.build_vocabulary()
+        tokens = [f"token{a * (size // MESSAGE_LENGTH)}" for a in range(MESSAGE_LENGTH)]
+
+        legacy = time_per_call(lambda: legacy_bag_of_words(tokens), repeat=max(REPEAT * 1000 // size, 5))
+        indexed = time_per_call(lambda: primitive_model.bag_of_words(tokens))
+        print(f"{size:>10d} | {legacy * 1e6:>12.1f} | {indexed * 1e6:>12.1f} | {legacy / indexed:>7.1f}x", file=sys.stderr)
+
+
+def load_corpus_sentences():
+    """
+    Load every utterance of the intents corpus
+
+    Returns:
+        List[str]: list of utterances
+    """
+    primitive_model.resolve_paths()
+    with open(primitive_model.PATH_INTENT) as f:
+        data = json.load(f)
+    return [sentence for intent_data in data.values() for sentence in intent_data["patterns"]]
+
+
+def benchmark_tokenizers():
+    """ Preprocessing throughput of each tokenizer backend on the intents corpus """
+    sentences = load_corpus_sentences()
+    print(f"{'tokenizer':>10s} | {'tokens/s':>12s}", file=sys.stderr)
+    for tokenizer in primitive_model.TOKENIZERS:
+        if tokenizer == "nltk" and not primitive_model.nltk_available():
+            print(f"{tokenizer:>10s} | {'(skipped)':>12s}", file=sys.stderr)
+            continue
+        token_count = sum(len(primitive_model.tokenize(sentence, tokenizer)) for sentence in sentences)
+        seconds = time_per_call(lambda: [primitive_model.preprocess(sentence, tokenizer) for sentence in sentences])
+        print(f"{tokenizer:>10s} | {token_count / seconds:>12.0f}", file=sys.stderr)
+
+
+###############
+# ENTRY POINT #
+###############
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the NLP chat path")
+    parser.add_argument("--intents", type=int, default=20, help="number of synthetic intents")
+    parser.add_argument("--utterances", type=int, default=30, help="number of utterances per intent")
+    parser.add_argument("--vocabulary", type=int, default=2000, help="number of distinct synthetic words")
+    parser.add_argument("--words", type=int, default=6, help="number of words per utterance")
+    parser.add_argument("--samples", type=int, default=2000, help="number of timed calls per benchmark")
+    parser.add_argument("--epochs", type=int, default=10, help="training epochs for create_and_train_model")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the synthetic corpus")
+    parser.add_argument("--skip-train", action="store_true", help="skip create_and_train_model (no tensorflow needed)")
+    parser.add_argument("--vocabulary-scaling", action="store_true", help="also compare featurization with the legacy one")
+    parser.add_argument("--tokenizers", action="store_true", help="also benchmark the tokenizer backends")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Keep per-prediction debug logs out of the timings and out of the JSON on stdout
+    log.VERBOSE_LEVEL = max(log.VERBOSE_LEVEL, 5)
+    # Side reports go to stderr, they read the repository corpus so they run before the suite swaps it out
+    if args.tokenizers:
+        benchmark_tokenizers()
+    report = run_suite(args)
+    if args.vocabulary_scaling:
+        benchmark_vocabulary_scaling()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import json
+from array import array
+
+import numpy as np
+
+from src.nlp.artifact_store import SparseRows
+
+# Supported corpus formats, picked by file extension
+# - ".json":  the hand-edited intents file, {intent => {"patterns": [utterances...]}}
+# - ".jsonl": one {"intent": ..., "utterance": ...} object per line, streamed line by line (meant for large corpora)
+JSON_LINES_EXTENSION = ".jsonl"
+
+
+def iter_utterances(path):
+    """
+    Stream the utterances of a corpus file
+
+    Args:
+        path (str): corpus file path, see JSON_LINES_EXTENSION
+
+    Returns:
+        Iterator[Tuple(str, str)]: (intent, utterance) in file order
+    """
+    if not path.endswith(JSON_LINES_EXTENSION):
+        # The intents file is small enough to be parsed at once
+        with open(path) as f:
+            data = json.load(f)
+        for intent, intent_data in data.items():
+            for utterance in intent_data["patterns"]:
+                yield intent, utterance
+        return
+
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield record["intent"], record["utterance"]
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{line_number}: invalid utterance record ({e})")
+
+
+def scan_corpus(path, preprocess):
+    """
+    First pass over the corpus: collect the dictionary, the intents and the utterances, tokens are not kept
+
+    Args:
+        path (str): corpus file path
+        preprocess (Callable[[str], List[str]]): utterance => tokens
+
+    Returns:
+        Tuple(List[str], List[str], Dict[str, List[str]]): (sorted dictionary, intents in order of first appearance, utterances)
+    """
+    dictionary = set()
+    utterances = {}
+    for intent, utterance in iter_utterances(path):
+        utterances.setdefault(intent, []).append(utterance)
+        dictionary.update(preprocess(utterance))
+    return sorted(dictionary), list(utterances), utterances
+
+
+def encode_corpus(path, encode, intents):
+    """
+    Second pass over the corpus: encode every utterance straight into CSR arrays
+
+    Args:
+        path (str): corpus file path
+        encode (Callable[[str], List[int]]): utterance => sorted dictionary indices
+        intents (List[str]): intents returned by scan_corpus
+
+    Returns:
+        Tuple(SparseRows, np.array): (sparse training data, intent index of each row)
+    """
+    intent_index = {intent: index for index, intent in enumerate(intents)}
+    # Compact typed buffers, a row costs its non-zeros instead of a Python list
+    indptr, indices, labels = array("q", [0]), array("i"), array("i")
+    for intent, utterance in iter_utterances(path):
+        indices.extend(encode(utterance))
+        indptr.append(len(indices))
+        labels.append(intent_index[intent])
+    return (SparseRows(np.frombuffer(indptr, dtype=np.int64), np.frombuffer(indices, dtype=np.int32)),
+            np.frombuffer(labels, dtype=np.int32))
+
+
+def iter_batches(rows, width, batch_size, labels=None, class_count=None, seed=None):
+    """
+    Densify sparse rows one batch at a time
+
+    Args:
+        rows (SparseRows): sparse bag-of-words rows
+        width (int): number of columns (dictionary size)
+        batch_size (int): number of rows per batch
+        labels (np.array): intent index of each row, None to only densify the rows
+        class_count (int): number of intents, required with labels
+        seed (int): random seed to shuffle the rows with, None keeps them in order
+
+    Returns:
+        Iterator[Tuple(np.array, np.array)]: (dense 0/1 inputs, one-hot labels or None) of at most batch_size rows
+    """
+    order = np.arange(len(rows)) if seed is None else np.random.default_rng(seed).permutation(len(rows))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        x = np.zeros((len(batch), width), dtype=np.float32)
+        for i, row in enumerate(batch):
+            x[i, rows[row]] = 1
+        y = None
+        if labels is not None:
+            y = np.zeros((len(batch), class_count), dtype=np.float32)
+            y[np.arange(len(batch)), np.asarray(labels)[batch]] = 1
+        yield x, y
+
+
+def append_utterance(path, intent, utterance):
+    """
+    Add an utterance to a corpus file
+
+    Args:
+        path (str): corpus file path
+        intent (str): intent of the utterance
+        utterance (str): utterance to be added
+    """
+    if path.endswith(JSON_LINES_EXTENSION):
+        with open(path, "a") as f:
+            f.write(json.dumps({"intent": intent, "utterance": utterance}) + "\n")
+        return
+
+    with open(path) as f:
+        data = json.load(f)
+    data[intent]["patterns"].append(utterance)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=4)
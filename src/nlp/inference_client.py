@@ -0,0 +1,137 @@
+# Built-in imports
+import asyncio
+import itertools
+import time
+
+# Project imports
+from src.data import settings
+from src.nlp import sidecar_protocol as protocol
+import src.utils.log_util as log
+
+# External imports
+import numpy as np
+
+
+class InferenceClient:
+    """ Client of the inference sidecar (src/nlp/inference_server.py), raises ConnectionError whenever it is unusable """
+
+    def __init__(self, path):
+        """
+        Initialize a client, it connects on the first request
+
+        Args:
+            path (str): Unix socket path of the sidecar
+        """
+        self.path = path
+        self.reader_task = None
+        self.writer = None
+        self.write_lock = None
+        self.connect_lock = None
+
+        # { request id => future }
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        # { intents id => [intents...] }, as announced by the server
+        self.intents = {}
+        # Don't try to reconnect before this (monotonic) time
+        self.retry_time = 0
+
+    @property
+    def connected(self):
+        return self.writer is not None
+
+    async def classify(self, message):
+        """
+        Classify a message on the sidecar, same contract as InferenceExecutor.classify
+
+        Args:
+            message (str): input message
+
+        Returns:
+            Tuple(str, Tuple): (stage that filtered the message out, None if it went through, predict result or None)
+        """
+        await self._ensure_connected()
+        request_id = next(self.request_ids) & 0xFFFFFFFF
+        future = asyncio.get_event_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            self.writer.write(protocol.pack_request(request_id, message))
+            async with self.write_lock:
+                await self.writer.drain()
+            return await asyncio.wait_for(future, settings.NLP_SIDECAR_TIMEOUT)
+        except asyncio.TimeoutError:
+            # A hung sidecar is treated like a dead one, otherwise every message would wait for the timeout
+            log.warning(f"NLP sidecar at {self.path} timed out, using in-process inference")
+            self._disconnect()
+            raise ConnectionError("NLP sidecar timed out")
+        except OSError as e:
+            self._disconnect()
+            raise ConnectionError(f"NLP sidecar connection failed: {e}")
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def _ensure_connected(self):
+        if self.connected:
+            return
+        if self.connect_lock is None:
+            self.connect_lock = asyncio.Lock()
+        # Concurrent requests share one connection attempt
+        async with self.connect_lock:
+            if self.connected:
+                return
+            if time.monotonic() < self.retry_time:
+                raise ConnectionError("NLP sidecar is unavailable")
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError as e:
+                self.retry_time = time.monotonic() + settings.NLP_SIDECAR_RETRY_INTERVAL
+                log.warning(f"NLP sidecar at {self.path} is unavailable, using in-process inference: {e}")
+                raise ConnectionError(f"NLP sidecar is unavailable: {e}")
+            self.writer = writer
+            self.write_lock = asyncio.Lock()
+            self.reader_task = asyncio.ensure_future(self._read_loop(reader, writer))
+            log.info(f"Connected to the NLP sidecar at {self.path}")
+
+    async def _read_loop(self, reader, writer):
+        """ Resolve pending requests with the responses of the server """
+        try:
+            while True:
+                data = protocol.unpack_server_frame(await protocol.read_frame(reader))
+                if data[0] == protocol.TYPE_INTENTS:
+                    _, intents_id, intents = data
+                    self.intents = {intents_id: intents}
+                    continue
+
+                _, request_id, status, intents_id, confidences = data
+                future = self.pending.get(request_id)
+                if future is None or future.done():
+                    continue
+                if status != protocol.STATUS_OK:
+                    future.set_result((protocol.STATUSES[status], None))
+                    continue
+                intents = self.intents.get(intents_id)
+                if intents is None or len(intents) != len(confidences):
+                    future.set_exception(protocol.ProtocolError(f"Unknown intents {intents_id}"))
+                    continue
+                index = int(np.argmax(confidences))
+                result = intents[index], confidences[index], {intent: confidences[a] for a, intent in enumerate(intents)}
+                future.set_result((None, result))
+        except (asyncio.IncompleteReadError, OSError, ValueError) as e:
+            log.warning(f"Lost connection to the NLP sidecar: {e}")
+        finally:
+            if writer is self.writer:
+                self._disconnect()
+
+    def _disconnect(self):
+        """ Drop the connection, pending requests fail so that their callers fall back to in-process inference """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.retry_time = time.monotonic() + settings.NLP_SIDECAR_RETRY_INTERVAL
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Lost connection to the NLP sidecar"))
+        self.pending.clear()
+
+    def __str__(self):
+        return f"Inference client for {self.path} ({'connected' if self.connected else 'disconnected'}, {len(self.pending)} pending)"
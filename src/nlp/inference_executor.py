@@ -0,0 +1,127 @@
+# Built-in imports
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Project imports
+from src.data import settings
+from src.nlp import primitive_model
+import src.utils.log_util as log
+
+
+class InferenceExecutor:
+    """ Runs NLP inference off the event loop, concurrent messages are grouped into one forward pass """
+
+    def __init__(self, queue_size=None, batch_size=None, batch_wait=None):
+        """
+        Initialize an inference executor, the worker starts on the first prediction
+
+        Args:
+            queue_size (int): maximum number of waiting messages, defaults to NLP_INFERENCE_QUEUE_SIZE
+            batch_size (int): maximum number of messages per batch, defaults to NLP_INFERENCE_BATCH_SIZE
+            batch_wait (float): seconds to wait for a batch to fill up, defaults to NLP_INFERENCE_BATCH_WAIT
+        """
+        self.queue_size = queue_size or settings.NLP_INFERENCE_QUEUE_SIZE
+        self.batch_size = batch_size or settings.NLP_INFERENCE_BATCH_SIZE
+        self.batch_wait = settings.NLP_INFERENCE_BATCH_WAIT if batch_wait is None else batch_wait
+
+        # A single thread keeps the model accessed by one batch at a time
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nlp-inference")
+        # Created lazily so that they belong to the running event loop
+        self.queue = None
+        self.worker = None
+
+        # Statistics
+        self.batch_count = 0
+        self.message_count = 0
+        self.shed_count = 0
+
+    async def classify(self, message):
+        """
+        Preprocess a message, filter out the ones the model can't say anything about, and classify the rest
+
+        Args:
+            message (str): input message
+
+        Returns:
+            Tuple(str, Tuple): (stage that filtered the message out, None if it went through, predict result or None)
+        """
+        tokens = primitive_model.preprocess(message)
+
+        # Cheap pre-classifier, out-of-domain messages would be fed an (almost) all-zero input
+        overlap = primitive_model.vocabulary_overlap(tokens)
+        if overlap == 0:
+            return "no_overlap", None
+        if overlap < settings.NLP_MIN_OVERLAP_RATIO:
+            return "low_overlap", None
+
+        result = await self.predict(tokens, message)
+        # Inference is overloaded, the message was dropped
+        if result is None:
+            return "dropped", None
+        return None, result
+
+    async def predict(self, tokens, message=None):
+        """
+        Queue a message for inference and wait for its result
+
+        Args:
+            tokens (List[str]): preprocessed tokens of the input message
+            message (str): raw input message, looked up in the utterance index on the inference thread first
+
+        Returns:
+            Tuple(str, float, Dict[str, float]): same as primitive_model.predict, None if the queue is full
+        """
+        self._ensure_started()
+        future = asyncio.get_event_loop().create_future()
+        try:
+            self.queue.put_nowait((tokens, message, future))
+        except asyncio.QueueFull:
+            self.shed_count += 1
+            log.warning(f"NLP inference queue is full, dropping message {tokens}")
+            return None
+        return await future
+
+    def _ensure_started(self):
+        if self.worker is not None and not self.worker.done():
+            return
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.worker = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        """ Worker loop, collects a batch and runs it on the inference thread """
+        loop = asyncio.get_event_loop()
+        while True:
+            # Wait for the first message, then give others a short window to join
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            token_lists = [tokens for tokens, _, _ in batch]
+            # Repeats of training utterances are answered by the index, its lookups stay off the event loop too
+            messages = [message for _, message, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.pool, primitive_model.predict_tokens_batch, token_lists, messages)
+            except Exception as e:
+                log.error(f"NLP inference failed for a batch of {len(batch)}: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batch_count += 1
+            self.message_count += len(batch)
+            for (_, _, future), result in zip(batch, results):
+                # The caller might have been cancelled while waiting
+                if not future.done():
+                    future.set_result(result)
+
+    def __str__(self):
+        return f"Inference executor ({self.message_count} messages in {self.batch_count} batches, {self.shed_count} dropped)"
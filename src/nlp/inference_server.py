@@ -0,0 +1,130 @@
+"""
+Inference sidecar: owns the NLP model and serves predictions to every bot process on the host over a Unix socket
+e.g.
+    python src/nlp/inference_server.py --socket /tmp/base-nlp.sock
+"""
+# Built-in imports
+import argparse
+import asyncio
+import os
+import sys
+
+# Stabilize imports
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(current_dir, "..", ".."))  # repository root
+
+# Project imports
+from src.data import settings
+from src.nlp import primitive_model, sidecar_protocol as protocol
+from src.nlp.inference_executor import InferenceExecutor
+import src.utils.log_util as log
+
+
+class InferenceServer:
+    """ Serves InferenceExecutor.classify over a Unix socket, requests from every connection share the batches """
+
+    def __init__(self, path):
+        """
+        Initialize an inference server, the model is loaded when the server starts
+
+        Args:
+            path (str): Unix socket path
+        """
+        self.path = path
+        self.executor = InferenceExecutor()
+        self.server = None
+        self.fingerprint = None
+
+        # Statistics
+        self.connection_count = 0
+        self.request_count = 0
+
+    async def start(self):
+        """ Load the model and start listening """
+        loop = asyncio.get_event_loop()
+        log.info("Loading NLP model...")
+        await loop.run_in_executor(None, primitive_model.load_or_train_model)
+        self.fingerprint = primitive_model.load_fingerprint()
+
+        # A socket file left behind by a previous run would make the bind fail
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = await asyncio.start_unix_server(self.handle_connection, path=self.path)
+        asyncio.ensure_future(self.watch_artifacts())
+        log.info(f"NLP inference server is listening on {self.path}")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        """ Read requests until the client disconnects, each one is answered as soon as its batch is done """
+        self.connection_count += 1
+        # Per-connection state: the intents the client knows about, and a lock so that only one task drains at a time
+        state = {"intents": None, "intents_id": 0, "lock": asyncio.Lock()}
+        tasks = set()
+        try:
+            while True:
+                request_id, message = protocol.unpack_request(await protocol.read_frame(reader))
+                self.request_count += 1
+                task = asyncio.ensure_future(self.respond(writer, state, request_id, message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            self.connection_count -= 1
+
+    async def respond(self, writer, state, request_id, message):
+        """ Classify one message and write the response (preceded by the intents if they changed) """
+        try:
+            stage, result = await self.executor.classify(message)
+        except Exception as e:
+            log.error(f"NLP inference failed for \"{message}\": {e}")
+            stage, result = "error", None
+
+        data = b""
+        if result is None:
+            data += protocol.pack_response(request_id, protocol.STATUSES.index(stage))
+        else:
+            intents = tuple(result[2].keys())
+            if intents != state["intents"]:
+                state["intents"] = intents
+                state["intents_id"] += 1
+                data += protocol.pack_intents(state["intents_id"], intents)
+            data += protocol.pack_response(request_id, protocol.STATUS_OK, state["intents_id"], list(result[2].values()))
+
+        # Intents and response go out in one write, so they can't be interleaved with other responses
+        writer.write(data)
+        async with state["lock"]:
+            await writer.drain()
+
+    async def watch_artifacts(self):
+        """ Pick up models retrained by a bot process (add_utterance), the fingerprint is written last """
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(settings.NLP_SIDECAR_RELOAD_INTERVAL)
+            fingerprint = primitive_model.load_fingerprint()
+            if fingerprint is None or fingerprint == self.fingerprint:
+                continue
+            try:
+                await loop.run_in_executor(None, primitive_model.reload_artifacts)
+                self.fingerprint = fingerprint
+                log.info(f"NLP inference server reloaded the model ({fingerprint[:12]})")
+            except Exception as e:
+                log.error(f"NLP inference server failed to reload the model: {e}")
+
+    def __str__(self):
+        return f"Inference server on {self.path} ({self.connection_count} connections, {self.request_count} requests)"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NLP inference sidecar")
+    parser.add_argument("--socket", default=settings.NLP_SIDECAR_SOCKET, help="Unix socket path (default: NLP_SIDECAR_SOCKET)")
+    args = parser.parse_args()
+    assert args.socket, "No socket path, pass --socket or set NLP_SIDECAR_SOCKET in settings!"
+    asyncio.get_event_loop().run_until_complete(InferenceServer(args.socket).serve_forever())
@@ -0,0 +1,137 @@
+import numpy as np
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+
+def softmax(x):
+    """
+    Numerically stable softmax over the last axis
+
+    Args:
+        x (np.array): logits
+
+    Returns:
+        np.array: probabilities, each row sums up to 1
+    """
+    exp = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return exp / np.sum(exp, axis=-1, keepdims=True)
+
+
+ACTIVATIONS["softmax"] = softmax
+
+# Storage types of the weight matrices, biases always stay float32 (they are tiny)
+# - smaller types only save disk and resident memory: NumPy casts the weights to a float32 temporary on every matmul,
+#   so inference is slower than at full precision (e.g. ~7x for float16 with a 100k words vocabulary)
+# - "float16": half precision
+# - "int8": symmetric per-tensor quantization, the matmul output is multiplied by the scale of the tensor
+PRECISIONS = ("float32", "float16", "int8")
+
+
+class NumpyModel:
+    """ Pure NumPy forward pass of the intent classifier, mirrors the tflearn network without importing it """
+
+    def __init__(self, weights, biases, activations, precision="float32", scales=None):
+        """
+        Construct the model from exported parameters
+
+        Args:
+            weights (List[np.array]): weight matrix of each fully connected layer, shape (n_in, n_out)
+            biases (List[np.array]): bias vector of each fully connected layer, shape (n_out,)
+            activations (List[str]): activation name of each layer, see ACTIVATIONS
+            precision (str): storage type of the weights, see PRECISIONS
+            scales (List[float]): dequantization scale of each weight matrix, only for "int8"
+        """
+        assert len(weights) == len(biases) == len(activations), "Every layer needs a weight, a bias and an activation!"
+        assert precision in PRECISIONS, f"Unknown precision {precision}, expected one of {PRECISIONS}!"
+        assert (scales is not None) == (precision == "int8"), "Scales are required for int8 weights, and only for them!"
+        self.precision = precision
+        self.weights = [np.asarray(w, dtype=precision) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        self.scales = None if scales is None else [float(scale) for scale in scales]
+
+    @property
+    def nbytes(self):
+        """ Size of the parameters in memory """
+        return sum(w.nbytes for w in self.weights) + sum(b.nbytes for b in self.biases)
+
+    def quantize(self, precision):
+        """
+        Convert the weights of a full-precision model to a smaller storage type
+
+        Args:
+            precision (str): target storage type, see PRECISIONS
+
+        Returns:
+            NumpyModel: new model sharing the biases and activations
+        """
+        assert self.precision == "float32", "Only a full-precision model can be quantized!"
+        if precision != "int8":
+            return NumpyModel(self.weights, self.biases, self.activations, precision)
+
+        quantized, scales = [], []
+        for weight in self.weights:
+            # Symmetric range [-127, 127], so that 0 stays exactly 0
+            scale = float(np.max(np.abs(weight))) / 127 or 1.0
+            quantized.append(np.clip(np.round(weight / scale), -127, 127))
+            scales.append(scale)
+        return NumpyModel(quantized, self.biases, self.activations, precision, scales)
+
+    def predict(self, x):
+        """
+        Run the forward pass, same contract as tflearn.DNN.predict
+
+        Args:
+            x (Iterable[np.array]): batch of bag-of-words vectors
+
+        Returns:
+            np.array: softmax output of shape (batch, n_intents)
+        """
+        output = np.asarray(x, dtype=np.float32)
+        for i, (weight, bias, activation) in enumerate(zip(self.weights, self.biases, self.activations)):
+            # A float32 input promotes the product to float32, NumPy makes a float32 copy of smaller weights for this
+            output = output @ weight
+            if self.scales is not None:
+                output *= self.scales[i]
+            output = ACTIVATIONS[activation](output + bias)
+        return output
+
+    def save(self, path):
+        """
+        Save the parameters to a plain array file
+
+        Args:
+            path (str): .npz file path
+        """
+        arrays = {}
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"W{i}"] = weight
+            arrays[f"b{i}"] = bias
+        if self.scales is not None:
+            arrays["scales"] = np.array(self.scales, dtype=np.float64)
+        np.savez(path, activations=np.array(self.activations), precision=np.array(self.precision), **arrays)
+
+    @staticmethod
+    def load(path):
+        """
+        Load parameters saved by NumpyModel.save
+
+        Args:
+            path (str): .npz file path
+
+        Returns:
+            NumpyModel: loaded model
+        """
+        with np.load(path) as data:
+            activations = [str(a) for a in data["activations"]]
+            weights = [data[f"W{i}"] for i in range(len(activations))]
+            biases = [data[f"b{i}"] for i in range(len(activations))]
+            # Files exported before quantization was supported are float32
+            precision = str(data["precision"]) if "precision" in data.files else "float32"
+            scales = list(data["scales"]) if "scales" in data.files else None
+        return NumpyModel(weights, biases, activations, precision, scales)
@@ -1,35 +1,88 @@
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import hashlib
 import json
+import multiprocessing
 import os
-import pickle
+import re
+import threading
 
-import nltk
 import numpy as np
-import tensorflow as tf
-import tflearn
-from nltk.stem.lancaster import LancasterStemmer
+from src.data import settings
+from src.nlp import artifact_store, corpus
+from src.nlp.artifact_store import SparseRows
+from src.nlp.numpy_model import NumpyModel, PRECISIONS
+from src.nlp.utterance_index import UtteranceIndex
+from src.utils.cache_util import LRUCache
 import src.utils.log_util as log
 
-PATH_INTENT = "src/nlp/intents.json"
-PATH_WORDS_DATA = "src/nlp/data/bag_of_words.pickle"
+PATH_INTENT = settings.NLP_CORPUS_PATH
+PATH_WORDS_DATA = "src/nlp/data/bag_of_words"
 PATH_MODEL = "src/nlp/models/primitive.tflearn"
+PATH_WEIGHTS = "src/nlp/models/primitive.npz"
+PATH_FINGERPRINT = "src/nlp/models/primitive.fingerprint.json"
+PATH_HYPERPARAMETERS = "src/nlp/models/hyperparameters.json"
 
-nltk.download("punkt")
-stemmer = LancasterStemmer()
+# Bump this whenever the network layout or the data format changes in code
+# - invalidates every cached artifact that was produced by an older version
+MODEL_VERSION = 4
+
+# Heavy modules (tensorflow, tflearn, nltk) are imported on first use, see import_tensorflow and get_stemmer
+stemmer = None
+
+# Built-in tokenizer, splits like nltk.word_tokenize does for chat-sized messages
+# - contractions are split off ("don't" => "do", "n't" and "what's" => "what", "'s")
+# - so are the informal ones ("wanna" => "wan", "na" and "cannot" => "can", "not")
+# - hyphenated words and ellipses are kept together, every other symbol is a token of its own
+TOKEN_PATTERN = re.compile(r"\b(?:can(?=not\b)|gim(?=me\b)|gon(?=na\b)|got(?=ta\b)|lem(?=me\b)|wan(?=na\b))"
+                           r"|\w+(?=n't\b)|n't\b|'(?:s|re|ve|ll|m|d)\b|\w+(?:-\w+)*|\.\.\.|[^\w\s]", re.IGNORECASE)
+TOKENIZERS = ("regex", "nltk")
 
 # Global data variables
 dictionary = []  # dictionary of words we've seen (unique)
+vocabulary = {}  # dict of {word => index in dictionary}
 intents = []  # list of intents
 utterances = {}  # dict of {intent => [utterances...]}
-train_x, train_y = [], []  # training data lists
+train_x, train_y = SparseRows.from_lists([]), []  # sparse training data (bag-of-words indices, intent index)
 
 # Global model variables
 model = None
 model_changed = False
 
+# Everything a prediction reads, published as one tuple so that a prediction never sees a half-updated model
+# - (generation, model, vocabulary, intents, utterance index), the generation goes up every time a new tuple is published
+serving = (0, None, {}, [], None)
+
+# Recent predictions { (generation, sorted bag-of-words indices) => predict result }
+# - tokens outside the vocabulary don't change the model input, so they are not part of the key
+prediction_cache = LRUCache(settings.NLP_CACHE_SIZE, settings.NLP_CACHE_TTL)
+
+# Background retraining
+retrain_lock = threading.RLock()
+retrain_pool = None  # worker process pool, created on the first retrain
+retrain_future = None  # retrain that is currently running
+retrain_pending = False  # whether another retrain was requested while one is running
+
 
 #######################
 # DATA / FILE METHODS #
 #######################
+def resolve_paths():
+    """ Fall back to local paths if the NLP data is not reachable from the current working directory """
+    global PATH_INTENT, PATH_WORDS_DATA, PATH_MODEL, PATH_WEIGHTS, PATH_FINGERPRINT, PATH_HYPERPARAMETERS
+
+    error_count = 0
+    while not os.path.isfile(PATH_INTENT) and error_count < 5:
+        log.warning("Using local path for NLP data!")
+        PATH_INTENT = PATH_INTENT[4:]
+        PATH_WORDS_DATA = PATH_WORDS_DATA[4:]
+        PATH_MODEL = PATH_MODEL[4:]
+        PATH_WEIGHTS = PATH_WEIGHTS[4:]
+        PATH_FINGERPRINT = PATH_FINGERPRINT[4:]
+        PATH_HYPERPARAMETERS = PATH_HYPERPARAMETERS[4:]
+        error_count += 1
+
+
 def load_or_generate_data(force_generate=False, save_data=True):
     """
     Load data if exists or generate data from intents
@@ -51,84 +104,31 @@ def generate_data(save_data=True):
         save_data (bool): whether to save the data to file
     """
     global dictionary, intents, utterances, train_x, train_y
-    global PATH_INTENT, PATH_WORDS_DATA, PATH_MODEL
 
-    # Step 1: load data from intents file
-    data = None
-    error_count = 0
-    while data is None and error_count < 5:
-        try:
-            with open(PATH_INTENT) as f:
-                data = json.load(f)
-        except FileNotFoundError:
-            log.warning("Using local path for NLP data!")
-            PATH_INTENT = PATH_INTENT[4:]
-            PATH_WORDS_DATA = PATH_WORDS_DATA[4:]
-            PATH_MODEL = PATH_MODEL[4:]
-            error_count += 1
-
-    # Reset global variables (in case of re-train)
-    dictionary = set()
-    intents = []
-    utterances = {}
-    train_x, train_y = [], []
-
-    # Step 2: convert intent sentences into token lists
-    temp_x, temp_y = [], []
-    for intent, intent_data in data.items():
-        # Add intent to intent list
-        intents.append(intent)
-        # Get the list of patterns (utterances) in this intent
-        patterns = intent_data["patterns"]
-
-        # Process and save each pattern
-        for sentence in patterns:
-            # Save utterance
-            utterances[intent] = utterances.get(intent, []) + [sentence]
-            # Preprocess sentence
-            words = preprocess(sentence)
-            # Add words that appear in this sentence into the dictionary
-            dictionary.update(words)
-            # Add current sentence to training data
-            temp_x.append(words)
-            temp_y.append(intent)
+    # Step 1: stream the intents file (or a JSON Lines corpus) once to collect the dictionary
+    # - only the utterances are kept, their tokens are thrown away until the second pass
+    resolve_paths()
+    dictionary, intents, utterances = corpus.scan_corpus(PATH_INTENT, preprocess)
 
     # Now:
-    # - temp_x contains a list of list of tokens
-    # - temp_y contains a list of intents
-    # - dictionary contains all tokens in all sentences
-
-    # Convert dictionary to sorted list to keep ordering
-    # TODO: in the future, if this project gets bigger, this will need optimization
-    #       the bag-of-words array is really sparse, consists of mostly 0's and only few 1's
-    #       compress by only remembering the location of 1's?
-    dictionary = sorted(dictionary)
-
-    # Step 3: create training data by converting strings into bag of words
-    for i, tokens in enumerate(temp_x):
-        # TODO: optimize by converting dictionary to dict with {token => index}? O(1) lookup cost
-        #       convert back to list afterwards? not sure, just an idea
-        #       cause right now the complexity is O(len(tokens) * len(dictionary)) => O(n^2)
-
-        # See bag_of_words method for more details here
-        x = [1 if word in tokens else 0 for word in dictionary]
-
-        # Y is basically an all-zero array but the target intent's index is 1
-        # There should be only one 1 here
-        # Example: target intent is "identity"
-        # - Intents: ["greeting", "farewell", "identity", "age", ...]
-        # - Y array: [         0,          0,          1,     0, ...]
-        y = [0] * len(data)  # len(data) = how many classes (intents) there are
-        y[intents.index(temp_y[i])] = 1
-        train_x.append(x)
-        train_y.append(y)
+    # - dictionary contains all tokens in all sentences, sorted to keep ordering
+    # - intents contains the intents in order of first appearance
+    # Index the dictionary as {token => index}
+    build_vocabulary()
+
+    # Step 2: stream the corpus again to create sparse training data
+    # - X only remembers the location of the 1's in the bag of words (see encode method)
+    # - Y only remembers the index of the target intent, one-hot encoding is done in to_dense_y
+    # Example: target intent is "identity"
+    # - Intents: ["greeting", "farewell", "identity", "age", ...]
+    # - Y:       2
+    train_x, train_y = corpus.encode_corpus(PATH_INTENT, lambda sentence: encode(preprocess(sentence)), intents)
 
     # Training data is now in train_x and train_y
 
     # Save this bag-of-words training data for faster access in the future
     if save_data:
-        with open(PATH_WORDS_DATA, "wb") as f:
-            pickle.dump((dictionary, intents, utterances, train_x, train_y), f)
+        artifact_store.save(PATH_WORDS_DATA, dictionary, intents, utterances, train_x, train_y)
 
 
 def load_data():
@@ -140,15 +140,22 @@ def load_data():
     """
     global dictionary, intents, utterances, train_x, train_y
 
-    # Check file existence and permissions
-    if not os.path.isfile(PATH_WORDS_DATA) or not os.access(PATH_WORDS_DATA, os.R_OK):
+    resolve_paths()
+    # Memory-maps the training data, utterances are only read when needed
+    data = artifact_store.load(PATH_WORDS_DATA)
+    if data is None:
         return False
-    # Open file and load data
-    with open(PATH_WORDS_DATA, "rb") as f:
-        dictionary, intents, utterances, train_x, train_y = pickle.load(f)
+    dictionary, intents, utterances, train_x, train_y = data
+    build_vocabulary()
     return True
 
 
+def build_vocabulary():
+    """ Index the global dictionary as {token => index} for O(1) token lookups """
+    global vocabulary
+    vocabulary = {word: index for index, word in enumerate(dictionary)}
+
+
 def add_utterance(intent, utterance):
     """
     Add a new utterance to the target intent
@@ -159,56 +166,603 @@ def add_utterance(intent, utterance):
     """
     global model_changed
     assert intent in intents, f"Invalid intent \"{intent}\""
-    with open(PATH_INTENT) as f:
-        data = json.load(f)
-    data[intent]["patterns"].append(utterance)
-    with open(PATH_INTENT, "w") as f:
-        json.dump(data, f, indent=4)
+    corpus.append_utterance(PATH_INTENT, intent, utterance)
 
     model_changed = True
+    request_retrain()
+
+
+#######################
+# MODEL CACHE METHODS #
+#######################
+
+def get_hyperparameters():
+    """
+    Get the network hyperparameters, these are part of the model fingerprint
+    - defaults come from settings, the ones picked by the training CLI (src/nlp/train.py) take precedence
+
+    Returns:
+        Dict[str, Any]: hyperparameters dict
+    """
+    hyperparameters = {
+        "hidden_layers": list(settings.NLP_HIDDEN_LAYERS),
+        "epochs": settings.NLP_EPOCHS,
+        "batch_size": settings.NLP_BATCH_SIZE
+    }
+    if os.path.isfile(PATH_HYPERPARAMETERS):
+        with open(PATH_HYPERPARAMETERS) as f:
+            hyperparameters.update((key, value) for key, value in json.load(f).items() if key in hyperparameters)
+    return hyperparameters
+
+
+def save_hyperparameters(hyperparameters):
+    """
+    Override the hyperparameters in settings, the model is retrained on the next cache check
+
+    Args:
+        hyperparameters (Dict[str, Any]): hyperparameters dict, see get_hyperparameters
+    """
+    with open(PATH_HYPERPARAMETERS, "w") as f:
+        json.dump(hyperparameters, f, indent=4)
+
+
+def compute_fingerprint():
+    """
+    Fingerprint the intents corpus together with the network hyperparameters
+
+    Returns:
+        str: hex digest identifying the model that the current corpus and settings would produce
+    """
+    resolve_paths()
+    digest = hashlib.sha256()
+    with open(PATH_INTENT, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    # The tokenizer decides what the vocabulary looks like, so it is part of the fingerprint as well
+    # - the one actually used, installing the punkt data later changes the tokens of the "nltk" setting
+    digest.update(json.dumps({"version": MODEL_VERSION, "tokenizer": active_tokenizer(), **get_hyperparameters()}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def load_fingerprint():
+    """
+    Load the fingerprint of the cached model artifacts
+
+    Returns:
+        str: fingerprint of the cached artifacts, None if there is no (readable) cache
+    """
+    return _read_fingerprint_file().get("fingerprint")
+
+
+def load_parity():
+    """
+    Load the result of the parity check of the cached exported weights against the tflearn checkpoint
+
+    Returns:
+        bool: whether they passed, None if they were never checked (trained with the tflearn backend)
+    """
+    return _read_fingerprint_file().get("parity")
+
+
+def resolve_numpy_backend(fingerprint, data=None):
+    """
+    Decide whether the cached model is served by the numpy backend, checking the exported weights first if needed
+
+    Args:
+        fingerprint (str): fingerprint of the cached artifacts, the parity result is saved with it
+        data (Tuple(List[str], List[str], SparseRows)): (dictionary, intents, training data) of the cached artifacts,
+            defaults to the globals
+
+    Returns:
+        bool: whether the numpy backend is set in settings and the exported weights match the tflearn checkpoint
+    """
+    if settings.NLP_INFERENCE_BACKEND != "numpy":
+        return False
+    parity = load_parity()
+    if parity is None:
+        # Trained while the tflearn backend was set, the weights were exported but never checked
+        current_dictionary, current_intents, rows = data or (dictionary, intents, train_x)
+        log.info("NumPy inference was never checked against this tflearn model, checking it now")
+        reference = read_model(len(current_dictionary), len(current_intents))
+        parity = parity_check(reference, NumpyModel.load(PATH_WEIGHTS), rows=rows, width=len(current_dictionary))
+        save_fingerprint(fingerprint, parity)
+    if not parity:
+        log.warning("NumPy inference does not match tflearn, serving the tflearn model instead")
+    return parity
+
+
+def _read_fingerprint_file():
+    if not os.path.isfile(PATH_FINGERPRINT):
+        return {}
+    try:
+        with open(PATH_FINGERPRINT) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_fingerprint(fingerprint, parity=None):
+    """
+    Mark the artifacts currently on disk as produced by the fingerprint
+
+    Args:
+        fingerprint (str): fingerprint from compute_fingerprint
+        parity (bool): whether the exported weights passed the parity check, None if it wasn't run
+    """
+    with open(PATH_FINGERPRINT, "w") as f:
+        json.dump({"fingerprint": fingerprint, "parity": parity, "hyperparameters": get_hyperparameters()}, f, indent=4)
+
+
+def clear_fingerprint():
+    """ Invalidate the cached artifacts, done before they get overwritten """
+    if os.path.isfile(PATH_FINGERPRINT):
+        os.remove(PATH_FINGERPRINT)
+
+
+def load_or_train_model():
+    """
+    Reuse the cached data and model if the intents and hyperparameters did not change, retrain otherwise
+
+    Returns:
+        bool: whether the cached model was used (cache hit)
+    """
+    fingerprint = compute_fingerprint()
+    if fingerprint == load_fingerprint() and load_data():
+        try:
+            if resolve_numpy_backend(fingerprint):
+                load_numpy_model()
+            else:
+                load_model()
+            log.info(f"NLP model cache hit ({fingerprint[:12]}), skipping training")
+            return True
+        except Exception as e:
+            log.warning(f"NLP model cache is corrupted, retraining: {e}")
+    else:
+        log.info(f"NLP model cache miss ({fingerprint[:12]}), retraining")
+
+    retrain(fingerprint)
+    return False
+
+
+def retrain(fingerprint):
+    """
+    Rebuild the data and the model from the intents file and save them as the cached artifacts
+
+    Args:
+        fingerprint (str): fingerprint from compute_fingerprint, computed before the intents file is read
+    """
+    clear_fingerprint()
+    generate_data(save_data=True)
+    create_and_train_model(save_model=True)
+    export_weights()
+    # Unknown until checked, a cache hit with the numpy backend set checks it then (see resolve_numpy_backend)
+    parity = None
+    if settings.NLP_INFERENCE_BACKEND == "numpy":
+        # Parity is checked at full precision, quantization has its own check (see quantize_weights)
+        parity = parity_check(model, NumpyModel.load(PATH_WEIGHTS))
+        if parity:
+            load_numpy_model()
+        else:
+            log.warning("NumPy inference does not match tflearn, falling back to tflearn inference")
+    # Saved either way, the checkpoint is still a valid cache (and other processes watch for it)
+    save_fingerprint(fingerprint, parity)
+
+
+#########################
+# BACKGROUND RETRAINING #
+#########################
+
+def request_retrain():
+    """
+    Retrain the model in a worker process and hot-swap it in when done
+    - requests that arrive while a retrain is running are coalesced into one follow-up retrain
+    """
+    global retrain_pending
+    with retrain_lock:
+        if retrain_future is not None:
+            retrain_pending = True
+            log.info("NLP retrain already in progress, another one is queued")
+            return
+        _start_retrain()
+
+
+def is_retraining():
+    """
+    Returns:
+        bool: whether a background retrain is running
+    """
+    return retrain_future is not None
+
+
+def _start_retrain():
+    """ Submit a retrain to the worker process, retrain_lock must be held """
+    global retrain_pool, retrain_future
+    if retrain_pool is None:
+        # Spawn rather than fork, a forked copy of a live tensorflow runtime is not safe to use
+        retrain_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    log.info("NLP retrain started in the background")
+    retrain_future = retrain_pool.submit(_retrain_worker)
+    retrain_future.add_done_callback(_on_retrain_done)
+
+
+def _retrain_worker():
+    """
+    Runs in the worker process, the artifacts are written to disk for the bot process to load
+
+    Returns:
+        bool: whether the numpy backend can be used
+    """
+    retrain(compute_fingerprint())
+    return isinstance(model, NumpyModel)
+
+
+def _on_retrain_done(future):
+    """ Called from the pool when a retrain finishes, swaps in the new model and starts the queued retrain """
+    global retrain_future, retrain_pending, model_changed
+    success = False
+    try:
+        reload_artifacts(use_numpy=future.result())
+        success = True
+        log.info(f"NLP retrain complete, now serving {len(intents)} intents over {len(dictionary)} words")
+    except Exception as e:
+        log.error(f"NLP retrain failed: {e}")
+
+    with retrain_lock:
+        retrain_future = None
+        if retrain_pending:
+            retrain_pending = False
+            _start_retrain()
+        elif success:
+            model_changed = False
+
+
+def reload_artifacts(use_numpy=None):
+    """
+    Load the data and model artifacts on disk, written by a retrain (maybe in another process), and swap them in
+
+    Args:
+        use_numpy (bool): whether to load the exported weights rather than the tflearn checkpoint,
+            None to decide from settings and the parity check of the artifacts (see resolve_numpy_backend)
+    """
+    # Read the new data and model before touching any global, predictions keep using the old ones meanwhile
+    data = artifact_store.load(PATH_WORDS_DATA)
+    assert data is not None, "There is no valid data to reload!"
+    new_dictionary, new_intents, new_utterances, new_train_x, new_train_y = data
+    if use_numpy is None:
+        use_numpy = resolve_numpy_backend(load_fingerprint(), (new_dictionary, new_intents, new_train_x))
+    if use_numpy:
+        # Not swapped in yet, quantization must be checked against the new data rather than the globals
+        new_model = read_numpy_model(new_train_x, len(new_dictionary))
+    else:
+        new_model = read_model(len(new_dictionary), len(new_intents))
+    swap(new_dictionary, new_intents, new_utterances, new_train_x, new_train_y, new_model)
+
+
+def swap(new_dictionary, new_intents, new_utterances, new_train_x, new_train_y, new_model):
+    """
+    Replace the data and the model, predictions switch over in one step when the new model is published
+
+    Args:
+        new_dictionary (List[str]): sorted dictionary
+        new_intents (List[str]): list of intents
+        new_utterances (Dict[str, List[str]]): dict of {intent => [utterances...]}
+        new_train_x (SparseRows): sparse training data
+        new_train_y (np.array): training labels
+        new_model (Union[tflearn.DNN, NumpyModel]): model trained on this data
+    """
+    global dictionary, intents, utterances, train_x, train_y
+    dictionary, intents, utterances, train_x, train_y = new_dictionary, new_intents, new_utterances, new_train_x, new_train_y
+    build_vocabulary()
+    set_model(new_model)
 
 
 ##########################
 # NEURAL NETWORK METHODS #
 ##########################
 
-def create_and_train_model(epochs=1000, save_model=True):
+def build_model(input_size=None, output_size=None, hidden_layers=None, num_cores=None):
     """
-    Create and train the neural network
+    Build the (untrained) neural network in its own graph
 
     Args:
-        epochs (int): number of epochs to train for
-        save_model (bool): whether to save the trained model to file
-    """
-    global model, train_x, train_y
-    model = None
+        input_size (int): number of input units, defaults to the dictionary size
+        output_size (int): number of output units, defaults to the number of intents
+        hidden_layers (List[int]): width of each hidden layer, defaults to get_hyperparameters
+        num_cores (int): number of CPU cores tensorflow may use, defaults to all of them
 
-    # Build model
+    Returns:
+        tflearn.DNN: model wrapping the network
+    """
+    if hidden_layers is None:
+        hidden_layers = get_hyperparameters()["hidden_layers"]
+    tf, tflearn = import_tensorflow()
     with tf.Graph().as_default():
+        if num_cores is not None:
+            tflearn.init_graph(num_cores=num_cores)
+        # Keep track of the fully connected layers, their variables are exported for NumPy inference
+        layers = []
         # Input layer's shape is basically the number of unique words in the dictionary
-        net = tflearn.input_data(shape=[None, len(train_x[0])])
-        net = tflearn.fully_connected(net, 8)
-        net = tflearn.fully_connected(net, 8)
+        net = tflearn.input_data(shape=[None, len(dictionary) if input_size is None else input_size])
+        for width in hidden_layers:
+            net = tflearn.fully_connected(net, width)
+            layers.append((net, "linear"))
         # Output layer's shape is basically the number of intents
         # Softmax activation will output a "confidence" percentage, range=[0, 1]
-        net = tflearn.fully_connected(net, len(train_y[0]), activation="softmax")
+        net = tflearn.fully_connected(net, len(intents) if output_size is None else output_size, activation="softmax")
+        layers.append((net, "softmax"))
         net = tflearn.regression(net)
-        model = tflearn.DNN(net)
+        dnn = tflearn.DNN(net)
+        dnn.fully_connected_layers = layers
+        return dnn
+
+
+def create_and_train_model(epochs=None, save_model=True):
+    """
+    Create and train the neural network
+
+    Args:
+        epochs (int): number of epochs to train for, defaults to get_hyperparameters
+        save_model (bool): whether to save the trained model to file
+    """
+    set_model(None)
+    hyperparameters = get_hyperparameters()
+    if epochs is None:
+        epochs = hyperparameters["epochs"]
 
+    # Build model
+    new_model = build_model()
+    with new_model.net.graph.as_default():
         # Train model
-        model.fit(train_x, train_y, n_epoch=epochs, batch_size=8)
+        fit_rows(new_model, train_x, train_y, len(dictionary), len(intents), epochs, hyperparameters["batch_size"])
 
         # Save model
         if save_model:
-            model.save(PATH_MODEL)
+            new_model.save(PATH_MODEL)
+    set_model(new_model)
+
+
+def fit_rows(current_model, rows, labels, width, class_count, epochs, batch_size):
+    """
+    Train a model on sparse rows, must be called within the graph of the model
+
+    Args:
+        current_model (tflearn.DNN): model to train
+        rows (SparseRows): sparse training data
+        labels (np.array): intent index of each row
+        width (int): dictionary size
+        class_count (int): number of intents
+        epochs (int): number of epochs to train for
+        batch_size (int): training batch size
+    """
+    if len(rows) <= settings.NLP_TRAIN_CHUNK_SIZE:
+        for x, y in corpus.iter_batches(rows, width, max(len(rows), 1), labels, class_count):
+            current_model.fit(x, y, n_epoch=epochs, batch_size=batch_size)
+        return
+    # Large corpora are densified one shuffled chunk at a time, the full dense matrix never exists
+    for epoch in range(epochs):
+        for x, y in corpus.iter_batches(rows, width, settings.NLP_TRAIN_CHUNK_SIZE, labels, class_count, seed=epoch):
+            current_model.fit(x, y, n_epoch=1, batch_size=batch_size)
 
 
 def load_model():
     """ Load model from disk """
-    # TODO: check correctness of this cause tflearn is wonk
-    global model
-    model = tflearn.DNN(None)
-    model.load(PATH_MODEL)
+    set_model(read_model())
+
+
+def read_model(input_size=None, output_size=None):
+    """
+    Read the saved model from disk, the network is rebuilt first since tflearn only restores variables
+
+    Args:
+        input_size (int): number of input units, defaults to the dictionary size
+        output_size (int): number of output units, defaults to the number of intents
+
+    Returns:
+        tflearn.DNN: loaded model
+    """
+    new_model = build_model(input_size, output_size)
+    with new_model.net.graph.as_default():
+        new_model.load(PATH_MODEL)
+    return new_model
+
+
+def set_model(new_model):
+    """
+    Replace the model used for prediction and publish it together with the current vocabulary and intents
+    - cached predictions of the old model are dropped
+
+    Args:
+        new_model (Union[tflearn.DNN, NumpyModel]): any model with a tflearn-style predict method
+    """
+    global model, serving
+    model = new_model
+    serving = (serving[0] + 1, model, vocabulary, intents, build_index() if model is not None else None)
+    prediction_cache.clear()
+
+
+def build_index():
+    """
+    Index the current utterances for the near-duplicate fast path, statistics of the previous index carry over
+
+    Returns:
+        UtteranceIndex: new index, None if NLP_INDEX_THRESHOLD disables it
+    """
+    if settings.NLP_INDEX_THRESHOLD is None:
+        return None
+    previous = serving[4]
+    return UtteranceIndex(utterances, settings.NLP_INDEX_THRESHOLD, previous.counts if previous is not None else None,
+                          settings.NLP_INDEX_MAX_POSTINGS, settings.NLP_INDEX_CANDIDATES)
+
+
+def export_weights(path=None):
+    """
+    Dump the weights and biases of the trained tflearn model into a plain array file
+
+    Args:
+        path (str): output .npz path, defaults to PATH_WEIGHTS
+    """
+    assert hasattr(model, "fully_connected_layers"), "Only a trained tflearn model can be exported!"
+    weights, biases, activations = [], [], []
+    for layer, activation in model.fully_connected_layers:
+        weights.append(model.get_weights(layer.W))
+        biases.append(model.get_weights(layer.b))
+        activations.append(activation)
+    if path is None:
+        # Quantized copies of the previous weights are stale now
+        for precision in PRECISIONS[1:]:
+            if os.path.isfile(weights_path(precision)):
+                os.remove(weights_path(precision))
+    NumpyModel(weights, biases, activations).save(path or PATH_WEIGHTS)
+
+
+def weights_path(precision="float32"):
+    """
+    Args:
+        precision (str): storage type of the weights, see PRECISIONS
+
+    Returns:
+        str: path of the exported weights in this precision, e.g. "src/nlp/models/primitive.int8.npz"
+    """
+    if precision == "float32":
+        return PATH_WEIGHTS
+    return f"{PATH_WEIGHTS[:-len('.npz')]}.{precision}.npz"
+
+
+def quantize_weights(precision=None, save=True, rows=None, width=None):
+    """
+    Quantize the exported full-precision weights and compare them with the full-precision model on the training data
+    - the quantized weights are only saved if every utterance fires the same intent (or none) as at full precision
+
+    Args:
+        precision (str): target storage type, defaults to NLP_WEIGHT_PRECISION in settings
+        save (bool): whether to save the quantized weights next to the full-precision ones
+        rows (SparseRows): training data the weights were trained on, defaults to the global train_x
+        width (int): dictionary size of that data, defaults to the size of the global dictionary
+
+    Returns:
+        Dict: accuracy report, see compare_models
+    """
+    precision = precision or settings.NLP_WEIGHT_PRECISION
+    reference = NumpyModel.load(PATH_WEIGHTS)
+    candidate = reference.quantize(precision)
+    report = compare_models(reference, candidate, rows=rows, width=width)
+    log.info(f"NLP weights quantized to {precision}: {report['bytes']} bytes instead of {report['reference_bytes']}, "
+             f"max difference = {report['max_difference']:.2e}, top-1 agreement = {report['top1_agreement'] * 100:.1f}%, "
+             f"firing agreement = {report['firing_agreement'] * 100:.1f}%")
+    if save and report["firing_agreement"] == 1:
+        candidate.save(weights_path(precision))
+    return report
+
+
+def compare_models(reference_model, candidate_model, threshold=None, rows=None, width=None):
+    """
+    Compare the outputs of two models on every utterance of the training data
+
+    Args:
+        reference_model (NumpyModel): full-precision model
+        candidate_model (NumpyModel): model under test, e.g. a quantized one
+        threshold (float): confidence an intent needs to fire, defaults to NLP_CONFIDENCE_THRESHOLD in settings
+        rows (SparseRows): training data the models were trained on, defaults to the global train_x
+        width (int): dictionary size of that data, defaults to the size of the global dictionary
+
+    Returns:
+        Dict: {
+            "precision": storage type of the candidate,
+            "bytes" / "reference_bytes": size of the parameters,
+            "max_difference": maximum absolute difference of any confidence,
+            "top1_agreement": ratio of utterances with the same most likely intent,
+            "firing_agreement": ratio of utterances firing the same intent (or none of them) above the threshold,
+            "changed": [utterance rows whose fired intent changed...]
+        }
+    """
+    threshold = settings.NLP_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    x = train_x if rows is None else rows
+    expected = predict_rows(reference_model, x, width)
+    actual = predict_rows(candidate_model, x, width)
+
+    def fired(output):
+        # Intent index that fires, -1 when the model is not confident enough
+        return np.where(np.max(output, axis=1) >= threshold, np.argmax(output, axis=1), -1)
+
+    changed = np.flatnonzero(fired(expected) != fired(actual))
+    return {
+        "precision": candidate_model.precision,
+        "bytes": candidate_model.nbytes,
+        "reference_bytes": reference_model.nbytes,
+        "max_difference": float(np.max(np.abs(expected - actual))) if len(x) else 0.0,
+        "top1_agreement": float(np.mean(np.argmax(expected, axis=1) == np.argmax(actual, axis=1))) if len(x) else 1.0,
+        "firing_agreement": 1 - len(changed) / len(x) if len(x) else 1.0,
+        "changed": changed.tolist(),
+    }
+
+
+def read_numpy_model(rows=None, width=None):
+    """
+    Read the exported weights in the precision set in settings, quantizing them first if needed
+
+    Args:
+        rows (SparseRows): training data of the exported weights, defaults to the global train_x (see quantize_weights)
+        width (int): dictionary size of that data, defaults to the size of the global dictionary
+
+    Returns:
+        NumpyModel: loaded model, full precision if the quantized weights would change which intents fire
+    """
+    precision = settings.NLP_WEIGHT_PRECISION
+    if precision != "float32" and not os.path.isfile(weights_path(precision)):
+        quantize_weights(precision, rows=rows, width=width)
+    if os.path.isfile(weights_path(precision)):
+        return NumpyModel.load(weights_path(precision))
+    log.warning(f"{precision} weights change which intents fire, serving full-precision weights instead")
+    return NumpyModel.load(PATH_WEIGHTS)
+
+
+def load_numpy_model(path=None):
+    """
+    Load the exported weights into the TensorFlow-free inference engine
+
+    Args:
+        path (str): exported .npz path, defaults to the weights in the precision set in settings
+    """
+    set_model(NumpyModel.load(path) if path else read_numpy_model())
+
+
+def parity_check(reference_model, candidate_model, tolerance=1e-4, rows=None, width=None):
+    """
+    Check that two models produce the same softmax outputs on the training data
+
+    Args:
+        reference_model (tflearn.DNN): model to compare against
+        candidate_model (NumpyModel): model under test
+        tolerance (float): maximum allowed absolute difference of any output
+        rows (SparseRows): training data of the models, defaults to the global train_x
+        width (int): dictionary size of that data, defaults to the size of the global dictionary
+
+    Returns:
+        bool: whether the outputs match within tolerance
+    """
+    rows = train_x if rows is None else rows
+    expected = predict_rows(reference_model, rows, width)
+    actual = predict_rows(candidate_model, rows, width)
+    difference = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+    log.info(f"NumPy inference parity check: max difference = {difference:.2e} (tolerance = {tolerance:.0e})")
+    return difference <= tolerance
+
+
+def predict_rows(current_model, rows, width=None):
+    """
+    Run a model over sparse rows, densified one chunk at a time
+
+    Args:
+        current_model (Union[tflearn.DNN, NumpyModel]): model to run
+        rows (SparseRows): sparse bag-of-words rows, e.g. the training data
+        width (int): dictionary size of the rows, defaults to the size of the global dictionary
+
+    Returns:
+        np.array: softmax output of shape (len(rows), len(intents))
+    """
+    batches = corpus.iter_batches(rows, len(dictionary) if width is None else width, settings.NLP_TRAIN_CHUNK_SIZE)
+    outputs = [np.asarray(current_model.predict(x)) for x, _ in batches]
+    return np.concatenate(outputs) if outputs else np.zeros((0, len(intents)), dtype=np.float32)
 
 
 def predict(message):
@@ -221,28 +775,94 @@ def predict(message):
     Returns:
         Tuple(str, float, Dict[str, float]): (predicted intent, confidence, entire result as a dict)
     """
-    assert model is not None, "Model must be initialized before predicting!"
+    return predict_batch([message])[0]
+
+
+def predict_batch(messages):
+    """
+    Generate intents for several messages with a single forward pass
+
+    Args:
+        messages (List[str]): input messages
+
+    Returns:
+        List[Tuple(str, float, Dict[str, float])]: one predict result per message, in order
+    """
+    return predict_tokens_batch([preprocess(message) for message in messages], messages)
+
+
+def match_utterance(message, current_index, current_intents):
+    """
+    Fast path: answer a message that (almost) repeats a training utterance without running the model
+
+    Args:
+        message (str): input message
+        current_index (UtteranceIndex): index to look the message up in, None if disabled
+        current_intents (List[str]): intents of the model the index belongs to
+
+    Returns:
+        Tuple(str, float, Dict[str, float]): same as predict with the similarity as confidence, None if there is no match
+    """
+    if current_index is None:
+        return None
+    match = current_index.lookup(message)
+    if match is None:
+        return None
+    intent, similarity = match
+    return intent, similarity, {a: similarity if a == intent else 0.0 for a in current_intents}
 
-    # Since model uses softmax, results should look something like this:
-    # > [0.003, 0.0001, 0.02, 0.34, 0.09, 0.80, 0.17, ...]
-    # - float in each position representing confidence
-    # - index represent index in the "intents" list (global)
-    results = model.predict([bag_of_words(preprocess(message))])[0]
-    log.debug("Predictions: [" + ", ".join(f"{a:.2f}" for a in results) + "]")
 
-    # We save the index of the maximum confidence
-    index = np.argmax(results)
-    # Convert index into intent
-    intent = intents[index]
-    # Return the intent
-    return intent, results[index], {intents[a]: results[a] for a in range(len(results))}
+def predict_tokens_batch(token_lists, messages=None):
+    """
+    Same as predict_batch, for messages that are already preprocessed
+
+    Args:
+        token_lists (List[List[str]]): preprocessed tokens of each message
+        messages (List[str]): raw messages to look up in the utterance index first, None to always run the model
+
+    Returns:
+        List[Tuple(str, float, Dict[str, float])]: one predict result per message, in order
+    """
+    # Read everything from one snapshot, a retrain might publish a new model in the meantime
+    generation, current_model, current_vocabulary, current_intents, current_index = serving
+    assert current_model is not None, "Model must be initialized before predicting!"
+
+    output = [None] * len(token_lists)
+    if messages is not None:
+        output = [match_utterance(message, current_index, current_intents) if message is not None else None for message in messages]
+    # Near matches the chat would not act on still go through the model, the more confident answer wins
+    pending = [i for i, result in enumerate(output) if result is None or result[1] < settings.NLP_CONFIDENCE_THRESHOLD]
+    keys = {i: (generation, tuple(encode(token_lists[i], current_vocabulary))) for i in pending}
+    predictions = {i: prediction_cache.get(keys[i]) for i in pending}
+    missing = [i for i in pending if predictions[i] is None]
+
+    if missing:
+        # Since model uses softmax, results should look something like this:
+        # > [0.003, 0.0001, 0.02, 0.34, 0.09, 0.80, 0.17, ...]
+        # - float in each position representing confidence
+        # - index represent index in the "intents" list
+        batch = current_model.predict(to_dense([keys[i][1] for i in missing], len(current_vocabulary)))
+
+        for i, results in zip(missing, batch):
+            log.debug("Predictions: [" + ", ".join(f"{a:.2f}" for a in results) + "]")
+            # We save the index of the maximum confidence
+            index = np.argmax(results)
+            # Convert index into intent
+            intent = current_intents[index]
+            predictions[i] = (intent, results[index], {current_intents[a]: results[a] for a in range(len(results))})
+            prediction_cache.put(keys[i], predictions[i])
+
+    for i in pending:
+        if output[i] is None or predictions[i][1] > output[i][1]:
+            output[i] = predictions[i]
+    return output
 
 
 ###################
 # UTILITY METHODS #
 ###################
 
-def preprocess(message):
+def preprocess(message, tokenizer=None):
     """
     Preprocesses the message into a list of tokens by tokenizing and stemming
     e.g.
@@ -254,6 +874,7 @@ def preprocess(message):
 
     Args:
         message (str): message to preprocess
+        tokenizer (str): one of TOKENIZERS, defaults to NLP_TOKENIZER in settings
 
     Returns:
         List[str]: list of preprocessed tokens (tokenized and stemmed)
@@ -262,12 +883,24 @@ def preprocess(message):
     if not message:
         return []
 
-    output = []
     # Tokenize message (split string into small tokens)
-    words = nltk.word_tokenize(message)
+    return stem_tokens(tokenize(message, tokenizer))
+
+
+def stem_tokens(words):
+    """
+    Stem tokens and drop punctuation and single letters, the second half of preprocess
+
+    Args:
+        words (List[str]): tokens of a message
+
+    Returns:
+        List[str]: list of preprocessed tokens
+    """
+    output = []
     for word in words:
         # Stem each word (eg. flying becomes fly after stemming)
-        word = stemmer.stem(word)
+        word = stem(word)
         # TODO: apply rules to filter tokens in the future, simple rules for now
         if word in ",.?!~" or len(word) <= 1:
             continue
@@ -275,9 +908,164 @@ def preprocess(message):
     return output
 
 
+def tokenize(message, tokenizer=None):
+    """
+    Split the message into word tokens
+
+    Args:
+        message (str): message to tokenize
+        tokenizer (str): one of TOKENIZERS, defaults to NLP_TOKENIZER in settings
+
+    Returns:
+        List[str]: list of tokens
+    """
+    if active_tokenizer(tokenizer) == "nltk":
+        import nltk
+        return nltk.word_tokenize(message)
+    return TOKEN_PATTERN.findall(message)
+
+
+def active_tokenizer(tokenizer=None):
+    """
+    Args:
+        tokenizer (str): one of TOKENIZERS, defaults to NLP_TOKENIZER in settings
+
+    Returns:
+        str: tokenizer actually used, "nltk" falls back to "regex" when its punkt data is not installed
+    """
+    tokenizer = tokenizer or settings.NLP_TOKENIZER
+    assert tokenizer in TOKENIZERS, f"Invalid tokenizer \"{tokenizer}\""
+    return "nltk" if tokenizer == "nltk" and nltk_available() else "regex"
+
+
+@functools.lru_cache(maxsize=1)
+def nltk_available():
+    """
+    Check if the punkt data for nltk.word_tokenize is installed, nothing is downloaded so startup works offline
+    - install it with: python -c "import nltk; nltk.download('punkt')"
+
+    Returns:
+        bool: whether the nltk tokenizer can be used
+    """
+    import nltk
+    try:
+        nltk.data.find("tokenizers/punkt")
+        return True
+    except LookupError:
+        log.warning("nltk punkt data is not installed, using the regex tokenizer instead")
+        return False
+
+
+@functools.lru_cache(maxsize=65536)
+def stem(word):
+    """
+    Memoized stemmer, chat messages repeat the same few words a lot
+
+    Args:
+        word (str): word to stem
+
+    Returns:
+        str: stemmed (and lower-cased) word
+    """
+    return get_stemmer().stem(word)
+
+
+def get_stemmer():
+    """
+    Create the stemmer on first use, importing nltk takes a while
+
+    Returns:
+        nltk.stem.lancaster.LancasterStemmer: stemmer
+    """
+    global stemmer
+    if stemmer is None:
+        from nltk.stem.lancaster import LancasterStemmer
+        stemmer = LancasterStemmer()
+    return stemmer
+
+
+def import_tensorflow():
+    """
+    Import tensorflow and tflearn on first use, they take seconds to import and are not needed to serve predictions
+
+    Returns:
+        Tuple(module, module): (tensorflow, tflearn)
+    """
+    import tensorflow as tf
+    import tflearn
+    return tf, tflearn
+
+
+def encode(tokens, index=None):
+    """
+    Generates a sparse bag-of-words representation of the token list
+    e.g.
+        Dict:   ["apple", "hello", "orange", "pineapple", "world", "again"]
+        Before: [         "hello",                        "world", "again"]
+        After:  [1, 4, 5]
+
+    Args:
+        tokens (List[str]): list of preprocessed tokens (tokenized and stemmed)
+        index (Dict[str, int]): vocabulary to encode with, defaults to the global vocabulary
+
+    Returns:
+        List[int]: sorted dictionary indices of the known tokens, O(len(tokens))
+    """
+    if index is None:
+        index = vocabulary
+    return sorted({index[word] for word in tokens if word in index})
+
+
+def vocabulary_overlap(tokens):
+    """
+    Fraction of the tokens that the model knows about, messages with no overlap get an all-zero input
+
+    Args:
+        tokens (List[str]): list of preprocessed tokens (tokenized and stemmed)
+
+    Returns:
+        float: ratio of in-vocabulary tokens, range=[0, 1] (0 for an empty list)
+    """
+    if not tokens:
+        return 0.0
+    return sum(1 for word in tokens if word in vocabulary) / len(tokens)
+
+
+def to_dense(rows, width=None):
+    """
+    Scatter sparse bag-of-words rows into a dense matrix, only needed at the model boundary
+
+    Args:
+        rows (Union[SparseRows, List[List[int]]]): rows generated by encode
+        width (int): number of columns, defaults to the dictionary size
+
+    Returns:
+        np.array: dense 0/1 matrix of shape (len(rows), width)
+    """
+    dense = np.zeros((len(rows), len(dictionary) if width is None else width), dtype=np.float32)
+    for i, indices in enumerate(rows):
+        dense[i, indices] = 1
+    return dense
+
+
+def to_dense_y(labels):
+    """
+    One-hot encode intent indices
+
+    Args:
+        labels (Union[np.array, List[int]]): intent indices
+
+    Returns:
+        np.array: one-hot matrix of shape (len(labels), len(intents))
+    """
+    dense = np.zeros((len(labels), len(intents)), dtype=np.float32)
+    dense[np.arange(len(labels)), labels] = 1
+    return dense
+
+
 def bag_of_words(tokens):
     """
-    Generates a bag-of-words representation of the token list, uses the global dictionary
+    Generates a bag-of-words representation of the token list, uses the global vocabulary
     e.g.
         Dict:   ["apple", "hello", "orange", "pineapple", "world", "again"]
         Before: [         "hello",                        "world", "again"]
@@ -289,10 +1077,6 @@ def bag_of_words(tokens):
     Returns:
         np.array: numpy array of the bag-of-words representation of the token list
     """
-    global dictionary
-    tokens = set(tokens)
-    # TODO: again, this could be faster with an improved dictionary data structure
-    #       Currently O(len(dictionary)), can be improved to O(len(tokens))
-    bag = [1 if word in tokens else 0 for word in dictionary]
-    assert len(bag) == len(dictionary), "INVALID BAG-OF-WORDS MODEL! THIS SHOULDN'T HAPPEN"
-    return np.array(bag)
+    bag = np.zeros(len(dictionary), dtype=np.float32)
+    bag[encode(tokens)] = 1
+    return bag
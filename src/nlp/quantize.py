@@ -0,0 +1,101 @@
+"""
+Quantization report: accuracy, size and load time of the exported weights in every precision, on the intents corpus
+e.g.
+    python src/nlp/quantize.py
+    python src/nlp/quantize.py --precisions int8 --save --output quantization.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Stabilize imports
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(current_dir, "..", ".."))  # repository root
+
+from src.data import settings
+from src.nlp import primitive_model
+from src.nlp.numpy_model import NumpyModel, PRECISIONS
+import src.utils.log_util as log
+
+LOAD_REPEAT = 20
+
+
+def measure_load(model):
+    """
+    Save a model to a scratch file and time loading it back
+
+    Args:
+        model (NumpyModel): model to measure
+
+    Returns:
+        Tuple(int, float): (file size in bytes, average load time in seconds)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "weights.npz")
+        model.save(path)
+        start = time.perf_counter()
+        for _ in range(LOAD_REPEAT):
+            NumpyModel.load(path)
+        return os.path.getsize(path), (time.perf_counter() - start) / LOAD_REPEAT
+
+
+def build_report(precisions, threshold):
+    """
+    Compare every precision against the full-precision weights
+
+    Args:
+        precisions (List[str]): storage types to evaluate, see PRECISIONS
+        threshold (float): confidence an intent needs to fire
+
+    Returns:
+        List[Dict]: one report per precision, see primitive_model.compare_models
+    """
+    reference = NumpyModel.load(primitive_model.PATH_WEIGHTS)
+    reports = []
+    for precision in precisions:
+        candidate = reference.quantize(precision)
+        report = primitive_model.compare_models(reference, candidate, threshold)
+        report["file_bytes"], report["load_seconds"] = measure_load(candidate)
+        reports.append(report)
+    return reports
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Accuracy report of the quantized intent classifier weights")
+    parser.add_argument("--precisions", nargs="+", choices=PRECISIONS, default=list(PRECISIONS), help="storage types to evaluate")
+    parser.add_argument("--threshold", type=float, default=settings.NLP_CONFIDENCE_THRESHOLD, help="confidence an intent needs to fire")
+    parser.add_argument("--save", action="store_true", help="save the quantized weights that fire the same intents as float32")
+    parser.add_argument("--output", help="also write the reports as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    primitive_model.load_or_generate_data(save_data=False)
+    assert os.path.isfile(primitive_model.PATH_WEIGHTS), "There are no exported weights, train the model first!"
+    reports = build_report(args.precisions, args.threshold)
+
+    print(f"Intents corpus: {len(primitive_model.train_y)} utterances, {len(primitive_model.intents)} intents, "
+          f"{len(primitive_model.dictionary)} words, threshold = {args.threshold}")
+    print(f"{'precision':>9s} | {'memory (B)':>10s} | {'file (B)':>9s} | {'load (ms)':>9s} | {'max diff':>8s} | {'top-1':>6s} | {'firing':>6s}")
+    for report in reports:
+        print(f"{report['precision']:>9s} | {report['bytes']:>10d} | {report['file_bytes']:>9d} | {report['load_seconds'] * 1000:>9.2f} | "
+              f"{report['max_difference']:>8.1e} | {report['top1_agreement'] * 100:>5.1f}% | {report['firing_agreement'] * 100:>5.1f}%")
+        for row in report["changed"]:
+            log.warning(f"{report['precision']}: utterance #{row} fires a different intent than at full precision")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=4)
+
+    if args.save:
+        for precision in args.precisions:
+            if precision != "float32":
+                primitive_model.quantize_weights(precision, save=True)
+
+
+if __name__ == "__main__":
+    main()
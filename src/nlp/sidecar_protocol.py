@@ -0,0 +1,90 @@
+import json
+import struct
+
+import numpy as np
+
+# Wire format of the inference sidecar, every frame is a uint32 length followed by the payload
+# - request:  type, request id                                + utf-8 message
+# - intents:  type, intents id                                + JSON list of intents (sent before the first response using them)
+# - response: type, request id, status, intents id           + float32 confidence of every intent (only if status is OK)
+FRAME_HEADER = struct.Struct("!I")
+REQUEST_HEADER = struct.Struct("!BI")
+INTENTS_HEADER = struct.Struct("!BI")
+RESPONSE_HEADER = struct.Struct("!BIBI")
+
+TYPE_REQUEST = 1
+TYPE_INTENTS = 2
+TYPE_RESPONSE = 3
+
+# Response status => stage that filtered the message out (see InferenceExecutor.classify)
+STATUSES = [None, "no_overlap", "low_overlap", "dropped", "error"]
+STATUS_OK = 0
+STATUS_ERROR = STATUSES.index("error")
+
+MAX_FRAME_SIZE = 1 << 20
+
+
+class ProtocolError(ConnectionError):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+async def read_frame(reader):
+    """
+    Read one frame
+
+    Args:
+        reader (asyncio.StreamReader): stream to read from
+
+    Returns:
+        bytes: frame payload, raises asyncio.IncompleteReadError when the stream ends
+    """
+    size, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {size} bytes is too large!")
+    return await reader.readexactly(size)
+
+
+def frame(payload):
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def pack_request(request_id, message):
+    return frame(REQUEST_HEADER.pack(TYPE_REQUEST, request_id) + message.encode())
+
+
+def pack_intents(intents_id, intents):
+    return frame(INTENTS_HEADER.pack(TYPE_INTENTS, intents_id) + json.dumps(list(intents)).encode())
+
+
+def pack_response(request_id, status, intents_id=0, confidences=()):
+    return frame(RESPONSE_HEADER.pack(TYPE_RESPONSE, request_id, status, intents_id) + np.asarray(confidences, dtype=">f4").tobytes())
+
+
+def unpack_request(payload):
+    """
+    Returns:
+        Tuple(int, str): (request id, message)
+    """
+    message_type, request_id = REQUEST_HEADER.unpack_from(payload)
+    if message_type != TYPE_REQUEST:
+        raise ProtocolError(f"Expected a request, got frame type {message_type}")
+    return request_id, payload[REQUEST_HEADER.size:].decode()
+
+
+def unpack_server_frame(payload):
+    """
+    Decode a frame sent by the server
+
+    Returns:
+        Tuple: (TYPE_INTENTS, intents id, intents) or (TYPE_RESPONSE, request id, status, intents id, confidences)
+    """
+    message_type = payload[0]
+    if message_type == TYPE_INTENTS:
+        _, intents_id = INTENTS_HEADER.unpack_from(payload)
+        return TYPE_INTENTS, intents_id, json.loads(payload[INTENTS_HEADER.size:].decode())
+    if message_type == TYPE_RESPONSE:
+        _, request_id, status, intents_id = RESPONSE_HEADER.unpack_from(payload)
+        confidences = np.frombuffer(payload, dtype=">f4", offset=RESPONSE_HEADER.size).astype(np.float32)
+        return TYPE_RESPONSE, request_id, status, intents_id, confidences
+    raise ProtocolError(f"Unknown frame type {message_type}")
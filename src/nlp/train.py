@@ -0,0 +1,184 @@
+"""
+Training CLI: k-fold cross-validated hyperparameter sweep over a process pool, the best configuration is persisted
+e.g.
+    python src/nlp/train.py --folds 5 --hidden-layers 8,8 16,16 32 --epochs 200 500 1000 --batch-sizes 8 16
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Stabilize imports
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(current_dir, "..", ".."))  # repository root
+
+import numpy as np
+
+from src.nlp import primitive_model
+from src.nlp.artifact_store import SparseRows
+import src.utils.log_util as log
+
+# Training data of the worker process, set once by the pool initializer instead of being sent with every task
+# - sparse rows and labels, each fold is densified one chunk at a time (see primitive_model.fit_rows)
+worker_x, worker_y = None, None
+worker_width, worker_class_count = 0, 0
+
+
+def make_folds(labels, fold_count, seed=0):
+    """
+    Split the rows into stratified folds, every intent is spread over the folds as evenly as possible
+
+    Args:
+        labels (np.array): intent index of each row
+        fold_count (int): number of folds
+        seed (int): random seed of the shuffle
+
+    Returns:
+        List[np.array]: row indices of each fold
+    """
+    generator = np.random.default_rng(seed)
+    folds = [[] for _ in range(fold_count)]
+    offset = 0
+    for label in np.unique(labels):
+        rows = generator.permutation(np.flatnonzero(labels == label))
+        for i, row in enumerate(rows):
+            folds[(offset + i) % fold_count].append(row)
+        offset += len(rows)
+    return [np.array(sorted(fold), dtype=np.int64) for fold in folds]
+
+
+def _init_worker(x, y, width, class_count):
+    """ Pool initializer, runs once in every worker process """
+    global worker_x, worker_y, worker_width, worker_class_count
+    worker_x, worker_y, worker_width, worker_class_count = x, y, width, class_count
+
+
+def _select_rows(rows):
+    """ Sparse subset of the worker's training data """
+    return SparseRows.from_lists([worker_x[row] for row in rows])
+
+
+def _evaluate(config, train_rows, test_rows):
+    """
+    Train one configuration on one fold, runs in a worker process with its own tf.Graph
+
+    Args:
+        config (Tuple[Tuple[int], int, int]): (hidden layers, epochs, batch size)
+        train_rows (np.array): rows to train on
+        test_rows (np.array): held-out rows
+
+    Returns:
+        Tuple[float, float]: (held-out accuracy, training seconds)
+    """
+    hidden_layers, epochs, batch_size = config
+    start = time.perf_counter()
+    # One core per worker, the parallelism comes from the pool
+    model = primitive_model.build_model(worker_width, worker_class_count, list(hidden_layers), num_cores=1)
+    with model.net.graph.as_default():
+        primitive_model.fit_rows(model, _select_rows(train_rows), worker_y[train_rows], worker_width, worker_class_count, epochs, batch_size)
+        predictions = primitive_model.predict_rows(model, _select_rows(test_rows), worker_width)
+    seconds = time.perf_counter() - start
+    accuracy = float(np.mean(np.argmax(predictions, axis=1) == worker_y[test_rows]))
+    return accuracy, seconds
+
+
+def sweep(configs, fold_count, workers, seed=0):
+    """
+    Cross-validate every configuration over a process pool
+
+    Args:
+        configs (List[Tuple[Tuple[int], int, int]]): configurations to evaluate, see _evaluate
+        fold_count (int): number of folds
+        workers (int): number of worker processes
+        seed (int): random seed of the folds
+
+    Returns:
+        List[Dict]: one report per configuration, best (highest mean accuracy, then fastest) first
+    """
+    # Sent sparse (plain arrays rather than memory maps), workers never hold the full dense matrix
+    x = SparseRows(np.array(primitive_model.train_x.indptr), np.array(primitive_model.train_x.indices))
+    y = np.array(primitive_model.train_y)
+    width, class_count = len(primitive_model.dictionary), len(primitive_model.intents)
+    folds = make_folds(y, fold_count, seed)
+
+    scores = {config: [] for config in configs}
+    # Spawn rather than fork, every worker starts a clean tensorflow runtime
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(x, y, width, class_count)) as pool:
+        futures = {}
+        for config in configs:
+            for i, test_rows in enumerate(folds):
+                train_rows = np.concatenate([fold for a, fold in enumerate(folds) if a != i])
+                futures[pool.submit(_evaluate, config, train_rows, test_rows)] = config
+        for future in as_completed(futures):
+            scores[futures[future]].append(future.result())
+
+    reports = []
+    for config, results in scores.items():
+        accuracies = [accuracy for accuracy, _ in results]
+        reports.append({
+            "hidden_layers": list(config[0]),
+            "epochs": config[1],
+            "batch_size": config[2],
+            "accuracy_mean": float(np.mean(accuracies)),
+            "accuracy_std": float(np.std(accuracies)),
+            "train_seconds": float(sum(seconds for _, seconds in results)),
+        })
+    reports.sort(key=lambda a: (-a["accuracy_mean"], a["train_seconds"]))
+    return reports
+
+
+def parse_layers(value):
+    """ Parse "16,8" into (16, 8) """
+    return tuple(int(width) for width in value.split(",") if width)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter sweep for the intent classifier")
+    parser.add_argument("--folds", type=int, default=5, help="number of cross-validation folds")
+    parser.add_argument("--hidden-layers", type=parse_layers, nargs="+", default=[(8, 8)], help="hidden layer widths, e.g. 8,8 16")
+    parser.add_argument("--epochs", type=int, nargs="+", default=[1000], help="numbers of epochs to try")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8], help="batch sizes to try")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the folds")
+    parser.add_argument("--no-save", action="store_true", help="only report, don't persist the best model")
+    parser.add_argument("--output", help="also write the reports as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    primitive_model.generate_data(save_data=False)
+    assert len(primitive_model.train_y) >= args.folds, "Not enough utterances for this many folds!"
+
+    configs = list(itertools.product(args.hidden_layers, args.epochs, args.batch_sizes))
+    log.info(f"Evaluating {len(configs)} configurations x {args.folds} folds on {args.workers} workers...")
+    start = time.perf_counter()
+    reports = sweep(configs, args.folds, args.workers, args.seed)
+    log.info(f"Sweep complete in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'hidden layers':>14s} | {'epochs':>6s} | {'batch':>5s} | {'accuracy':>15s} | {'time (s)':>8s}")
+    for report in reports:
+        layers = ",".join(str(width) for width in report["hidden_layers"])
+        accuracy = f"{report['accuracy_mean'] * 100:5.1f}% +- {report['accuracy_std'] * 100:4.1f}"
+        print(f"{layers:>14s} | {report['epochs']:>6d} | {report['batch_size']:>5d} | {accuracy:>15s} | {report['train_seconds']:>8.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=4)
+
+    if args.no_save:
+        return
+    # Persist the best configuration and retrain it on all the data, the bot picks it up as a cache hit
+    best = reports[0]
+    log.info(f"Training the best configuration on all the data: {best}")
+    primitive_model.save_hyperparameters({key: best[key] for key in ("hidden_layers", "epochs", "batch_size")})
+    primitive_model.retrain(primitive_model.compute_fingerprint())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import re
+from collections import Counter
+
+NON_WORD_PATTERN = re.compile(r"[^\w\s]+")
+
+
+class UtteranceIndex:
+    """ Lookup of messages that (almost) repeat a training utterance, answered without running the model """
+
+    def __init__(self, utterances, threshold, counts=None, max_postings=500, candidates=20):
+        """
+        Index the training utterances
+
+        Args:
+            utterances (Dict[str, List[str]]): dict of {intent => [utterances...]}
+            threshold (float): trigram Jaccard similarity a near match has to exceed, 1 only allows exact matches
+            counts (Dict[str, int]): counters to keep counting into, e.g. those of the index being replaced
+            max_postings (int): trigrams found in more utterances than this are too common to look candidates up with
+            candidates (int): number of candidates (sharing the most rare trigrams) whose similarity is computed
+        """
+        self.threshold = threshold
+        self.max_postings = max_postings
+        self.candidates = candidates
+        # { normalized utterance => intent }, None if the utterance is used by several intents
+        self.exact = {}
+        # Intent and normalized text of each indexed utterance
+        self.intents = []
+        self.texts = []
+        # { trigram => [indexed utterance ids...] }
+        self.postings = {}
+
+        for intent, patterns in utterances.items():
+            for utterance in patterns:
+                text = self.normalize(utterance)
+                if text in self.exact:
+                    if self.exact[text] != intent:
+                        self.exact[text] = None
+                    continue
+                self.exact[text] = intent
+                grams = self.trigrams(text)
+                for gram in grams:
+                    self.postings.setdefault(gram, []).append(len(self.intents))
+                self.intents.append(intent)
+                self.texts.append(text)
+
+        # Statistics, carried over across rebuilds
+        self.counts = counts if counts is not None else {"lookup": 0, "exact": 0, "near": 0}
+
+    @staticmethod
+    def normalize(text):
+        """ Lowercase, drop punctuation and collapse whitespace, e.g. "What's  up?" => "whats up" """
+        return " ".join(NON_WORD_PATTERN.sub("", text.lower()).split())
+
+    @staticmethod
+    def trigrams(text):
+        """ Set of character trigrams of a normalized text, padded so that short words still have some """
+        padded = f" {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def lookup(self, message):
+        """
+        Find the intent of the training utterance closest to a message
+
+        Args:
+            message (str): raw input message
+
+        Returns:
+            Tuple(str, float): (intent, similarity), None if no utterance is similar enough or the closest ones disagree
+        """
+        self.counts["lookup"] += 1
+        text = self.normalize(message)
+        if text in self.exact:
+            intent = self.exact[text]
+            if intent is not None:
+                self.counts["exact"] += 1
+                return intent, 1.0
+            return None
+        if self.threshold >= 1:
+            return None
+
+        # The cost is bounded however large the corpus: common trigrams are skipped to find the candidates, and only
+        # the few candidates sharing the most of the remaining ones are compared in full
+        grams = self.trigrams(text)
+        shared = Counter()
+        for gram in grams:
+            postings = self.postings.get(gram, ())
+            if len(postings) <= self.max_postings:
+                shared.update(postings)
+
+        best_intent, best_similarity = None, self.threshold
+        for utterance_id, _ in shared.most_common(self.candidates):
+            candidate = self.trigrams(self.texts[utterance_id])
+            similarity = len(grams & candidate) / len(grams | candidate)
+            if similarity > best_similarity:
+                best_intent, best_similarity = self.intents[utterance_id], similarity
+            elif similarity == best_similarity and best_intent not in (None, self.intents[utterance_id]):
+                # Equally close to utterances of different intents, let the model decide
+                best_intent = None
+        if best_intent is None:
+            return None
+        self.counts["near"] += 1
+        return best_intent, best_similarity
+
+    @property
+    def served_ratio(self):
+        """ Ratio of looked up messages answered by the index """
+        if self.counts["lookup"] == 0:
+            return 0.0
+        return (self.counts["exact"] + self.counts["near"]) / self.counts["lookup"]
+
+    def __str__(self):
+        return (f"Utterance index ({len(self.exact)} utterances, threshold = {self.threshold}, "
+                f"served {self.served_ratio * 100:.1f}% of {self.counts['lookup']} messages)")
@@ -0,0 +1,85 @@
+"""
+Start-up time report: per-module import cost of booting app.py (everything up to connecting to Discord)
+e.g.
+    python src/startup_report.py --top 25
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+root_dir = os.path.join(current_dir, "..")
+
+# These should only be imported once the NLP chat interface is used
+HEAVY_MODULES = ("tensorflow", "tflearn", "nltk")
+
+BOOT_SCRIPT = "import src.app; src.app.create_bot()"
+
+
+def profile_boot():
+    """
+    Boot the bot (without connecting) in a fresh interpreter with -X importtime
+
+    Returns:
+        Tuple(List[Tuple[int, int, int, str]], float): ([(self us, cumulative us, depth, module)...], wall-clock seconds)
+    """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT], cwd=root_dir,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"Booting app.py failed:\n{process.stderr}")
+
+    # Lines look like "import time:       243 |        510 |   encodings.aliases"
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return imports, seconds
+
+
+def print_report(imports, seconds, top):
+    """
+    Print the most expensive imports of app.py and the heavy modules that got imported anyway
+
+    Args:
+        imports (List[Tuple[int, int, int, str]]): output of profile_boot
+        seconds (float): wall-clock seconds of the boot
+        top (int): number of imports to list
+    """
+    # Children are listed before their parent, the modules imported by app.py directly precede it one level deeper
+    app_index = max(i for i, (_, _, _, name) in enumerate(imports) if name == "src.app")
+    app_depth = imports[app_index][2]
+    top_level = []
+    for i in range(app_index - 1, -1, -1):
+        if imports[i][2] <= app_depth:
+            break
+        if imports[i][2] == app_depth + 1:
+            top_level.append(imports[i])
+    top_level.sort(key=lambda a: a[1], reverse=True)
+    total_us = imports[app_index][1]
+
+    print(f"Boot (interpreter + imports + create_bot) took {seconds:.2f}s, of which app.py imports took {total_us / 1e6:.2f}s")
+    print(f"{'cumulative (ms)':>15s} | {'self (ms)':>9s} | module (imported by app.py)")
+    for self_us, cumulative_us, _, name in top_level[:top]:
+        print(f"{cumulative_us / 1000:>15.1f} | {self_us / 1000:>9.1f} | {name}")
+
+    print(f"\n{'cumulative (ms)':>15s} | module (slowest overall)")
+    for _, cumulative_us, _, name in sorted(imports, key=lambda a: a[1], reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>15.1f} | {name}")
+
+    heavy = sorted({name for _, _, _, name in imports if name.split(".")[0] in HEAVY_MODULES})
+    if heavy:
+        print(f"\nWARNING: heavy NLP modules are imported at boot: {', '.join(heavy[:10])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-module import cost of booting app.py")
+    parser.add_argument("--top", type=int, default=20, help="number of modules to list")
+    args = parser.parse_args()
+    print_report(*profile_boot(), args.top)
@@ -0,0 +1,122 @@
+# Built-in imports
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class LRUCache:
+    """ Thread-safe least-recently-used cache with optional time-to-live, keeps hit/miss counters """
+
+    def __init__(self, max_size, ttl=None):
+        """
+        Construct an empty cache
+
+        Args:
+            max_size (int): maximum number of entries, the least recently used entry is evicted first
+            ttl (float): seconds an entry stays valid after it is stored, None to never expire
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # { key => (expire time, value) }
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Look up a key and mark it as recently used
+
+        Args:
+            key (Hashable): cache key
+            default (Any): value returned on a miss
+
+        Returns:
+            Any: cached value, default if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entry if the cache is full
+
+        Args:
+            key (Hashable): cache key
+            value (Any): value to store
+        """
+        if self.max_size <= 0:
+            return
+        expire_time = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expire_time, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """ Drop every entry, counters are kept """
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return f"LRU cache ({len(self)}/{self.max_size} entries, {self.hits} hits, {self.misses} misses)"
+
+
+class RenderCache:
+    """ Rendered objects (e.g. embeds) keyed by what they show, re-rendered only when the state they come from changes """
+
+    def __init__(self):
+        # { key => (version, value) }
+        self._entries = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, render):
+        """
+        Return the cached rendering of a key, rendering it first if missing or out of date
+
+        Args:
+            key (Hashable): what is rendered, e.g. ("help", "ping")
+            version (Hashable): state the rendering depends on, any change re-renders it
+            render (Callable[[], Any]): renders the value, the result must not be mutated by callers
+
+        Returns:
+            Any: rendered value
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = render()
+        self._entries[key] = (version, value)
+        return value
+
+    def clear(self):
+        """ Drop every entry, counters are kept """
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return f"Render cache ({len(self)} entries, {self.hits} hits, {self.misses} misses)"
@@ -1,8 +1,11 @@
 # Built-in imports
+import asyncio
 
 # Project imports
 from src.data import colors, settings, emojis
 from src.nlp import primitive_model
+from src.nlp.inference_client import InferenceClient
+from src.nlp.inference_executor import InferenceExecutor
 from src.utils.reaction_handler import ReactionHandler
 import src.utils.log_util as log
 # External imports
@@ -20,7 +23,24 @@ class ChatHandler:
             bot (BotClient): bot instance
         """
         self.bot = bot
-        self.initialize_nlp()
+        self.executor = InferenceExecutor()
+        # Client mode, inference runs in the sidecar if it is up (in-process otherwise)
+        self.client = InferenceClient(settings.NLP_SIDECAR_SOCKET) if settings.NLP_SIDECAR_SOCKET else None
+
+        # The NLP model is loaded on first use, so that the bot comes online without waiting for it
+        self.nlp_ready = False
+        self.nlp_lock = None
+
+        # How many messages each stage of on_message filtered out (or handled)
+        self.stage_counts = {
+            "no_overlap": 0,  # no token in the NLP vocabulary, model skipped
+            "low_overlap": 0,  # too few tokens in the NLP vocabulary, model skipped
+            "dropped": 0,  # inference queue is full
+            "error": 0,  # inference failed on the sidecar
+            "low_confidence": 0,  # prediction below NLP_CONFIDENCE_THRESHOLD
+            "no_handler": 0,  # no intent handler registered for the prediction
+            "handled": 0,
+        }
 
     async def on_message(self, author, message, channel, guild):
         """
@@ -32,26 +52,79 @@ class ChatHandler:
             channel (discord.TextChannel): text channel that the message is sent in
             guild (discord.Guild): guild that the message is sent in
         """
-
         raw_message = message.content
-        intent, confidence, confidence_dict = primitive_model.predict(raw_message)
+        stage, result = await self.classify(raw_message)
+        # Filtered out before (or by) inference
+        if result is None:
+            self.stage_counts[stage] += 1
+            return
+        intent, confidence, confidence_dict = result
 
         # If bot is not confident on the response, don't respond
         if confidence < settings.NLP_CONFIDENCE_THRESHOLD:
+            self.stage_counts["low_confidence"] += 1
             return
 
         # Trigger intent if exists
         handler = self.bot.intent_handlers.get(intent)
         if handler is None:
+            self.stage_counts["no_handler"] += 1
             return
 
+        self.stage_counts["handled"] += 1
         await handler.on_intent_detected_wrapper(author, confidence, confidence_dict, message, channel, guild)
 
-    @staticmethod
-    def initialize_nlp():
-        log.info("Loading NLP data... ")
-        primitive_model.load_or_generate_data(force_generate=True)
+    async def classify(self, raw_message):
+        """
+        Classify a message on the sidecar if configured and up, in-process otherwise
+
+        Args:
+            raw_message (str): message to classify
 
-        log.info("Training model...")
-        primitive_model.create_and_train_model()
-        log.info("Training complete! Model is now ready to be used!")
+        Returns:
+            Tuple(str, Tuple): (stage that filtered the message out, None if it went through, predict result or None)
+        """
+        if self.client is not None:
+            try:
+                return await self.client.classify(raw_message)
+            except ConnectionError:
+                pass
+        await self.initialize_nlp()
+        return await self.executor.classify(raw_message)
+
+    async def initialize_intents(self):
+        """ Load the intents and their utterances, in client mode the model itself stays in the sidecar """
+        if self.client is None:
+            await self.initialize_nlp()
+            return
+        if self.nlp_ready or primitive_model.intents:
+            return
+        if self.nlp_lock is None:
+            self.nlp_lock = asyncio.Lock()
+        async with self.nlp_lock:
+            if self.nlp_ready or primitive_model.intents:
+                return
+            # Memory-mapped artifact written by the sidecar, generated without saving if it has none yet
+            await asyncio.get_event_loop().run_in_executor(None, lambda: primitive_model.load_or_generate_data(save_data=False))
+
+    async def initialize_nlp(self):
+        """ Load (or train) the NLP model if that didn't happen yet, runs off the event loop """
+        if self.nlp_ready:
+            return
+        if self.nlp_lock is None:
+            self.nlp_lock = asyncio.Lock()
+        async with self.nlp_lock:
+            if self.nlp_ready:
+                return
+            log.info("Loading NLP model...")
+            await asyncio.get_event_loop().run_in_executor(None, self.load_nlp)
+            self.nlp_ready = True
+            log.info("Loading complete! Model is now ready to be used!")
+
+    @staticmethod
+    def load_nlp():
+        """ Runs in the executor, everything the first prediction would otherwise do on the event loop """
+        primitive_model.load_or_train_model()
+        # A cache hit never stems (or tokenizes) anything, nltk would be imported by the first chat message
+        primitive_model.get_stemmer()
+        primitive_model.tokenize("")
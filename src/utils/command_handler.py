@@ -26,6 +26,9 @@ class CommandHandler:
         self.usage = usage
         self.example = example
 
+        # [(scope, capacity, period)...], see src/utils/rate_limit_util.py, subclasses can declare their own
+        self.rate_limits = settings.COMMAND_RATE_LIMITS
+
     async def on_command(self, author, command, args, message, channel, guild):
         """
         Executes the command, should be overridden in the subclass
@@ -45,11 +48,14 @@ class CommandHandler:
 
     def get_help_embedded(self):
         """
-        Generates an embedded help message for this command
+        Generates an embedded help message for this command, rendered once (it only shows this command)
 
         Returns:
-            discord.Embed: embedded message
+            discord.Embed: embedded message (shared, don't modify it)
         """
+        return self.bot.embed_cache.get(("help", self.command), 0, self.render_help_embedded)
+
+    def render_help_embedded(self):
         embedded = discord.Embed(
             title=f"Help for command \"{self.command}\"",
             description=f"{self.description}",
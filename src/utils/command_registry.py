@@ -0,0 +1,77 @@
+class CommandRegistry:
+    """ Command handlers indexed by command and alias, lookups cost the same however many commands are registered """
+
+    def __init__(self, case_insensitive=False, prefix_matching=False):
+        """
+        Construct an empty registry
+
+        Args:
+            case_insensitive (bool): whether "/Help" finds "help" (names differing only by case then conflict)
+            prefix_matching (bool): whether an unambiguous prefix finds a command, e.g. "/he" => "help"
+        """
+        self.case_insensitive = case_insensitive
+        self.prefix_matching = prefix_matching
+
+        # Registration order, for listing
+        self.handlers = []
+        # { command or alias => handler }, folded to lowercase if case insensitive
+        self.names = {}
+        # { prefix of any name => handler }, None if the prefix is shared by several handlers
+        self.prefixes = {}
+        # Goes up with every registration, anything rendered from the registered commands is stale when it changes
+        self.version = 0
+
+    def register(self, handler):
+        """
+        Index a command handler under its command and every alias
+
+        Args:
+            handler (CommandHandler): command handler
+
+        Raises:
+            ValueError: a name is used twice, or is already taken by another handler
+        """
+        names = [self._key(name) for name in [handler.command, *handler.aliases]]
+        if len(set(names)) != len(names):
+            raise ValueError(f"{handler} uses the same name more than once: {names}")
+        for name in names:
+            if name in self.names:
+                raise ValueError(f"{handler} conflicts with {self.names[name]} on \"{name}\"")
+
+        self.handlers.append(handler)
+        self.version += 1
+        for name in names:
+            self.names[name] = handler
+            if self.prefix_matching:
+                for end in range(1, len(name) + 1):
+                    prefix = name[:end]
+                    # A prefix shared by two handlers (or their own names) is ambiguous
+                    self.prefixes[prefix] = handler if self.prefixes.get(prefix, handler) is handler else None
+
+    def get(self, name):
+        """
+        Find the handler of a command
+
+        Args:
+            name (str): command or alias as typed by the user
+
+        Returns:
+            CommandHandler: matching handler, None if unknown (or an ambiguous prefix)
+        """
+        key = self._key(name)
+        handler = self.names.get(key)
+        if handler is None and self.prefix_matching:
+            handler = self.prefixes.get(key)
+        return handler
+
+    def _key(self, name):
+        return name.lower() if self.case_insensitive else name
+
+    def __iter__(self):
+        return iter(self.handlers)
+
+    def __len__(self):
+        return len(self.handlers)
+
+    def __str__(self):
+        return f"Command registry ({len(self.handlers)} commands, {len(self.names)} names)"
@@ -0,0 +1,100 @@
+# Built-in imports
+import asyncio
+from collections import deque
+import time
+import traceback
+
+# Project imports
+from src.utils.metrics_util import Histogram
+import src.utils.log_util as log
+
+
+class CommandDispatcher:
+    """ Runs command handlers as tasks, at most max_concurrency at once, taking turns between guilds """
+
+    def __init__(self, max_concurrency, queue_size):
+        """
+        Construct an idle dispatcher
+
+        Args:
+            max_concurrency (int): maximum number of handlers running at once, over every guild
+            queue_size (int): maximum number of handlers waiting per guild, more are rejected
+        """
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+
+        # { guild key => deque([(name, coroutine factory, submit time)...]) }
+        self.queues = {}
+        # Guild keys with waiting handlers, in turn order
+        self.ready = deque()
+        # Running handler tasks
+        self.tasks = set()
+
+        # Statistics
+        self.wait_time = Histogram()
+        self.queued_count = 0
+        self.peak_queued_count = 0
+        self.completed_count = 0
+        self.rejected_count = 0
+
+    def submit(self, key, name, factory):
+        """
+        Queue a handler, it starts as soon as there is a free slot and it is its guild's turn
+
+        Args:
+            key (Hashable): fairness key, e.g. the guild id
+            name (str): handler name, for logging
+            factory (Callable[[], Coroutine]): creates the handler coroutine, only called once it starts
+
+        Returns:
+            bool: whether it was accepted, False if the queue of this key is full
+        """
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+        if len(queue) >= self.queue_size:
+            self.rejected_count += 1
+            return False
+
+        queue.append((name, factory, time.perf_counter()))
+        if len(queue) == 1:
+            self.ready.append(key)
+        self.queued_count += 1
+        self.peak_queued_count = max(self.peak_queued_count, self.queued_count)
+        self._pump()
+        return True
+
+    def _pump(self):
+        """ Start waiting handlers while there are free slots, one guild at a time """
+        while len(self.tasks) < self.max_concurrency and self.ready:
+            key = self.ready.popleft()
+            queue = self.queues[key]
+            name, factory, submit_time = queue.popleft()
+            self.queued_count -= 1
+            if queue:
+                # Back of the line, other guilds go first
+                self.ready.append(key)
+            else:
+                # Idle guilds don't keep an empty queue around
+                del self.queues[key]
+
+            self.wait_time.observe(time.perf_counter() - submit_time)
+            task = asyncio.ensure_future(self._run(name, factory))
+            self.tasks.add(task)
+            task.add_done_callback(self._on_done)
+
+    async def _run(self, name, factory):
+        try:
+            await factory()
+        except Exception:
+            # Handlers no longer fail through discord.py's on_error, which used to print the traceback
+            log.error(f"Handler \"{name}\" failed:\n{traceback.format_exc()}")
+
+    def _on_done(self, task):
+        self.tasks.discard(task)
+        self.completed_count += 1
+        self._pump()
+
+    def __str__(self):
+        return (f"Command dispatcher ({len(self.tasks)}/{self.max_concurrency} running, {self.queued_count} queued "
+                f"(peak {self.peak_queued_count}), {self.rejected_count} rejected, wait p95 {self.wait_time.percentile(95) * 1000:.1f}ms)")
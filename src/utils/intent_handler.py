@@ -32,8 +32,7 @@ class IntentHandler:
         if reply_message is None:
             return
 
-        await reply_message.add_reaction(emojis.MAGNIFYING_GLASS)
-        await self.bot.react_cross(reply_message)
+        await self.bot.add_reactions(reply_message, emojis.MAGNIFYING_GLASS, emojis.CROSS)
 
         async def on_react(_, _2, emote, _3, _4, _5):
             if emote == emojis.MAGNIFYING_GLASS:
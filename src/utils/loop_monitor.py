@@ -0,0 +1,82 @@
+# Built-in imports
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+# Project imports
+from src.utils.metrics_util import Histogram
+import src.utils.log_util as log
+
+
+class LoopMonitor:
+    """ Measures how late the event loop runs a timer (anything blocking the loop delays every task and the heartbeat) """
+
+    def __init__(self, interval, warning_lag, debug=False, slow_callback=0.1):
+        """
+        Construct a stopped monitor
+
+        Args:
+            interval (float): seconds between two measurements
+            warning_lag (float): lag (in seconds) logged as a warning
+            debug (bool): whether to enable asyncio debug mode and log the stack of whatever blocks the loop
+            slow_callback (float): seconds a callback may run before it is reported in debug mode
+        """
+        self.interval = interval
+        self.warning_lag = warning_lag
+        self.debug = debug
+        self.slow_callback = slow_callback
+
+        self.task = None
+        self.lag = Histogram()
+        self.last_lag = 0.0
+
+        # Debug mode watchdog, reads the loop thread's stack from another thread while the loop is stuck
+        self.loop_thread_id = None
+        self.last_tick = time.monotonic()
+
+    def start(self):
+        """ Start measuring, must be called from the running event loop """
+        if self.task is not None and not self.task.done():
+            return
+        loop = asyncio.get_event_loop()
+        # Time since construction (e.g. login) is not a stall
+        self.last_tick = time.monotonic()
+        if self.debug:
+            # asyncio logs every callback slower than this, with where its task was created
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.slow_callback
+            self.loop_thread_id = threading.get_ident()
+            threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+        self.task = asyncio.ensure_future(self._run())
+        log.info(f"Event loop monitor started (every {self.interval}s{', debug mode' if self.debug else ''})")
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_tick = time.monotonic()
+            # Time past the deadline of the sleep, i.e. how long ready callbacks wait for the loop
+            self.last_lag = max(loop.time() - start - self.interval, 0.0)
+            self.lag.observe(self.last_lag)
+            if self.last_lag >= self.warning_lag:
+                log.warning(f"Event loop lagged {self.last_lag * 1000:.0f}ms, something is blocking it")
+
+    def _watchdog(self):
+        """ Runs in its own thread, logs the loop thread's stack once per stall """
+        reported = False
+        while True:
+            time.sleep(self.slow_callback / 2)
+            stalled = time.monotonic() - self.last_tick > self.interval + self.slow_callback
+            if stalled and not reported:
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is not None:
+                    stack = "".join(traceback.format_stack(frame))
+                    log.warning(f"Event loop blocked for over {self.slow_callback * 1000:.0f}ms in:\n{stack}")
+            reported = stalled
+
+    def __str__(self):
+        return (f"Event loop lag: last {self.last_lag * 1000:.1f}ms, p50 {self.lag.percentile(50) * 1000:.1f}ms, "
+                f"p99 {self.lag.percentile(99) * 1000:.1f}ms, max {self.lag.max * 1000:.1f}ms")
@@ -0,0 +1,95 @@
+# Built-in imports
+import bisect
+from collections import defaultdict
+import time
+
+# Project imports
+from src.utils.metrics_util import CpuTimer, Histogram
+
+
+class MessageContext:
+    """ Everything the stages of the pipeline know about a message, stages fill it in as they go """
+
+    def __init__(self, message):
+        """
+        Args:
+            message (discord.Message): incoming message
+        """
+        self.message = message
+        self.author = message.author
+        self.channel = message.channel
+        self.guild = message.guild
+
+        # Set by the parsing stages
+        self.command = None
+        self.args = []
+        self.handler = None
+
+    def __str__(self):
+        return f"Message context for \"{self.message.content}\""
+
+
+class MessagePipeline:
+    """ Ordered stages that every incoming message goes through, each stage and handler is timed """
+
+    def __init__(self):
+        # [(priority, registration number, name, stage)...], sorted
+        self.stages = []
+
+        # Latency histograms
+        # - { stage name => wall-clock time of the stage }
+        self.stage_latency = defaultdict(Histogram)
+        # - { handler name => wall-clock time of the handler }
+        self.handler_latency = defaultdict(Histogram)
+        # - { handler name => CPU time of the handler itself, excluding other tasks that ran meanwhile }
+        self.handler_cpu = defaultdict(Histogram)
+
+    def register(self, name, stage, priority):
+        """
+        Add a stage, stages run by increasing priority (then registration order)
+
+        Args:
+            name (str): stage name, as reported in the histograms
+            stage (Callable[[MessageContext], Awaitable[bool]]): async stage, returns False to stop the pipeline
+            priority (int): position of the stage
+        """
+        assert all(name != a[2] for a in self.stages), f"Stage \"{name}\" is already registered!"
+        bisect.insort(self.stages, (priority, len(self.stages), name, stage))
+
+    async def run(self, context):
+        """
+        Run the stages on a message until one of them stops it
+
+        Args:
+            context (MessageContext): message to process
+        """
+        for _, _, name, stage in self.stages:
+            start = time.perf_counter()
+            try:
+                proceed = await stage(context)
+            finally:
+                self.stage_latency[name].observe(time.perf_counter() - start)
+            if not proceed:
+                return
+
+    async def run_handler(self, name, coroutine):
+        """
+        Await a handler, recording its wall-clock and CPU time
+
+        Args:
+            name (str): handler name, e.g. the command
+            coroutine (Coroutine): the handler call
+
+        Returns:
+            Any: whatever the handler returns
+        """
+        timer = CpuTimer(coroutine)
+        start = time.perf_counter()
+        try:
+            return await timer
+        finally:
+            self.handler_latency[name].observe(time.perf_counter() - start)
+            self.handler_cpu[name].observe(timer.cpu_time)
+
+    def __str__(self):
+        return f"Message pipeline ({', '.join(a[2] for a in self.stages)})"
@@ -0,0 +1,90 @@
+# Built-in imports
+import bisect
+import time
+
+# Upper bounds (seconds) of the histogram buckets, doubling from 10us to ~84s, plus an overflow bucket
+BUCKET_BOUNDS = [1e-5 * 2 ** i for i in range(24)]
+
+
+class Histogram:
+    """ Fixed-bucket latency histogram, constant memory however many samples are recorded """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """
+        Record one sample
+
+        Args:
+            seconds (float): measured duration
+        """
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """
+        Approximate percentile, the upper bound of the bucket it falls in (never more than the maximum)
+
+        Args:
+            p (float): percentile in [0, 100]
+
+        Returns:
+            float: seconds, 0 if there are no samples
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(round(p / 100 * self.count)))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[i], self.max) if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self):
+        return (f"{self.count} samples, mean {self.mean * 1000:.2f}ms, p50 {self.percentile(50) * 1000:.2f}ms, "
+                f"p95 {self.percentile(95) * 1000:.2f}ms, p99 {self.percentile(99) * 1000:.2f}ms, max {self.max * 1000:.2f}ms")
+
+
+class CpuTimer:
+    """
+    Awaitable wrapper of a coroutine that adds up the CPU time of each of its steps
+    - time.thread_time around a plain await would also count every other task that ran on the loop meanwhile
+    """
+
+    def __init__(self, coroutine):
+        """
+        Args:
+            coroutine (Coroutine): coroutine to run and measure
+        """
+        self.coroutine = coroutine
+        self.cpu_time = 0.0
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            start = time.thread_time()
+            try:
+                if error is None:
+                    signal = self.coroutine.send(value)
+                else:
+                    signal = self.coroutine.throw(error)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self.cpu_time += time.thread_time() - start
+            # Hand the future the coroutine is waiting on to the event loop, and pass its outcome back in
+            try:
+                value, error = (yield signal), None
+            except BaseException as e:
+                value, error = None, e
@@ -0,0 +1,132 @@
+# Built-in imports
+from collections import OrderedDict
+import time
+
+# Rate limit scopes, each one keys its buckets by the id of the matching message attribute
+SCOPES = ("user", "channel", "guild")
+
+# Seconds between evictions of the buckets of every action, so that rarely used actions don't keep theirs forever
+EVICT_INTERVAL = 60
+
+
+class TokenBuckets:
+    """ One token bucket per key, idle buckets are evicted once they would be full again anyway """
+
+    def __init__(self, capacity, period):
+        """
+        Construct an empty set of buckets
+
+        Args:
+            capacity (int): burst size, every bucket starts full
+            period (float): seconds to refill an empty bucket, i.e. capacity requests per period on average
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        # A bucket untouched for a whole period is full, dropping it is the same as keeping it
+        self.ttl = period
+
+        # { key => (tokens, last update time) }, least recently used first
+        self.buckets = OrderedDict()
+
+    def wait_time(self, key, now=None):
+        """
+        Args:
+            key (Hashable): bucket key
+            now (float): current monotonic time
+
+        Returns:
+            float: seconds until a request is allowed, 0 if it is allowed right away
+        """
+        tokens = self._tokens(key, time.monotonic() if now is None else now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def consume(self, key, now=None):
+        """
+        Take a token, the caller checked wait_time first
+
+        Args:
+            key (Hashable): bucket key
+            now (float): current monotonic time
+        """
+        now = time.monotonic() if now is None else now
+        self.buckets[key] = (self._tokens(key, now) - 1, now)
+        self.buckets.move_to_end(key)
+        self.evict(now)
+
+    def evict(self, now=None):
+        """ Drop the buckets idle for longer than the TTL, they are at the front """
+        now = time.monotonic() if now is None else now
+        while self.buckets:
+            key, (_, last_time) = next(iter(self.buckets.items()))
+            if now - last_time < self.ttl:
+                break
+            del self.buckets[key]
+
+    def _tokens(self, key, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return self.capacity
+        tokens, last_time = bucket
+        return min(self.capacity, tokens + (now - last_time) * self.rate)
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class RateLimiter:
+    """ Per-user, per-channel and per-guild token buckets for any number of named actions """
+
+    def __init__(self):
+        # { (action, scope, capacity, period) => TokenBuckets }
+        self.buckets = {}
+        self.evict_time = time.monotonic()
+
+        # Statistics
+        self.allowed_count = 0
+        self.rejected_count = 0
+
+    def acquire(self, action, limits, author, channel, guild):
+        """
+        Take a token from every bucket of an action, or from none of them if any is empty
+
+        Args:
+            action (str): what is limited, e.g. a command name
+            limits (List[Tuple[str, int, float]]): (scope, capacity, period) of each limit, see SCOPES and TokenBuckets
+            author (discord.User): message sender
+            channel (discord.abc.Messageable): channel that the message is sent in
+            guild (discord.Guild): guild that the message is sent in, None in DMs (guild limits don't apply)
+
+        Returns:
+            float: 0 if allowed, seconds until it would be allowed otherwise
+        """
+        targets = {"user": author, "channel": channel, "guild": guild}
+        now = time.monotonic()
+        if now - self.evict_time > EVICT_INTERVAL:
+            self.evict_time = now
+            for buckets in self.buckets.values():
+                buckets.evict(now)
+
+        keyed = []
+        for scope, capacity, period in limits:
+            assert scope in SCOPES, f"Unknown rate limit scope \"{scope}\", expected one of {SCOPES}!"
+            if targets[scope] is None:
+                continue
+            key = (action, scope, capacity, period)
+            if key not in self.buckets:
+                self.buckets[key] = TokenBuckets(capacity, period)
+            keyed.append((self.buckets[key], targets[scope].id))
+
+        wait = max((buckets.wait_time(target, now) for buckets, target in keyed), default=0.0)
+        if wait > 0:
+            self.rejected_count += 1
+            return wait
+        for buckets, target in keyed:
+            buckets.consume(target, now)
+        self.allowed_count += 1
+        return 0.0
+
+    def __len__(self):
+        return sum(len(buckets) for buckets in self.buckets.values())
+
+    def __str__(self):
+        return f"Rate limiter ({len(self)} live buckets, {self.allowed_count} allowed, {self.rejected_count} rejected)"
@@ -0,0 +1,127 @@
+# Built-in imports
+import asyncio
+import heapq
+import itertools
+import time
+import traceback
+
+# Project imports
+import src.utils.log_util as log
+
+
+class ReactionRegistry:
+    """ Reaction handlers indexed by message id, a background task fires on_timeout as soon as each one expires """
+
+    def __init__(self):
+        """ Construct an empty registry, the sweeper task starts with the first registration """
+        # { message id => [handlers...] }, newest last
+        self.handlers = {}
+        # Min-heap of (expire time, registration number, handler), entries of handlers that already reacted are skipped
+        self.expiry = []
+        self.sequence = itertools.count()
+
+        # Created lazily so that they belong to the running event loop
+        self.sweeper = None
+        self.wakeup = None
+
+        # Statistics
+        self.react_count = 0
+        self.timeout_count = 0
+        # Seconds between the expire time of a handler and its on_timeout call
+        self.sweep_lag_total = 0.0
+        self.sweep_lag_max = 0.0
+
+    def register(self, handler):
+        """
+        Add a handler, must be called from the event loop
+
+        Args:
+            handler (ReactionHandler): reaction handler
+        """
+        self.handlers.setdefault(handler.message.id, []).append(handler)
+        heapq.heappush(self.expiry, (handler.expire_time, next(self.sequence), handler))
+
+        if self.sweeper is None or self.sweeper.done():
+            self.wakeup = asyncio.Event()
+            self.sweeper = asyncio.ensure_future(self._sweep())
+        elif self.expiry[0][2] is handler:
+            # Expires before everything else, the sweeper has to wake up earlier than planned
+            self.wakeup.set()
+
+    def pop(self, message_id, emoji):
+        """
+        Remove and return the newest live handler waiting for this reaction on this message
+
+        Args:
+            message_id (int): id of the reacted message
+            emoji (Union[discord.Emoji, str]): reaction emote
+
+        Returns:
+            ReactionHandler: matching handler, None if there is none (expired ones are left to the sweeper)
+        """
+        handlers = self.handlers.get(message_id)
+        if not handlers:
+            return None
+        now = time.time()
+        for a in range(len(handlers) - 1, -1, -1):
+            handler = handlers[a]
+            if now <= handler.expire_time and emoji in handler.emojis:
+                self._remove(handler)
+                self.react_count += 1
+                return handler
+        return None
+
+    def _remove(self, handler):
+        """
+        Returns:
+            bool: whether the handler was still registered
+        """
+        handlers = self.handlers.get(handler.message.id)
+        if not handlers or handler not in handlers:
+            return False
+        handlers.remove(handler)
+        if not handlers:
+            del self.handlers[handler.message.id]
+        return True
+
+    async def _sweep(self):
+        """ Sleep until the earliest expire time, then fire the timeouts of every expired handler """
+        while self.expiry:
+            timeout = self.expiry[0][0] - time.time()
+            if timeout > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            while self.expiry and self.expiry[0][0] <= now:
+                expire_time, _, handler = heapq.heappop(self.expiry)
+                if not self._remove(handler):
+                    continue
+                lag = now - expire_time
+                self.timeout_count += 1
+                self.sweep_lag_total += lag
+                self.sweep_lag_max = max(self.sweep_lag_max, lag)
+                # Callbacks run concurrently, a slow one doesn't hold back the others (or the next sweep)
+                asyncio.ensure_future(self._fire_timeout(handler))
+
+    @staticmethod
+    async def _fire_timeout(handler):
+        try:
+            await handler.on_timeout()
+        except Exception:
+            log.error(f"{handler} failed on timeout:\n{traceback.format_exc()}")
+
+    @property
+    def sweep_lag_average(self):
+        return self.sweep_lag_total / self.timeout_count if self.timeout_count else 0.0
+
+    def __len__(self):
+        return sum(len(handlers) for handlers in self.handlers.values())
+
+    def __str__(self):
+        return (f"Reaction registry ({len(self)} pending, {self.react_count} reacted, {self.timeout_count} timed out, "
+                f"sweep lag avg {self.sweep_lag_average * 1000:.1f}ms / max {self.sweep_lag_max * 1000:.1f}ms)")
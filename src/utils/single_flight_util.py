@@ -0,0 +1,50 @@
+# Built-in imports
+import asyncio
+from collections import Counter
+
+
+class SingleFlight:
+    """ Concurrent identical requests share one in-flight computation, and all of them get its result (or exception) """
+
+    def __init__(self):
+        # { (operation, args...) => task }
+        self.flights = {}
+
+        # Statistics, per operation
+        self.call_counts = Counter()
+        self.coalesced_counts = Counter()
+
+    async def do(self, key, factory):
+        """
+        Run factory unless the same key is already running, in which case wait for that one instead
+
+        Args:
+            key (Tuple): (operation, args...), the operation name is used for the counters
+            factory (Callable[[], Awaitable]): starts the computation
+
+        Returns:
+            Any: result of the computation
+        """
+        self.call_counts[key[0]] += 1
+        task = self.flights.get(key)
+        if task is not None:
+            self.coalesced_counts[key[0]] += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self.flights[key] = task
+            task.add_done_callback(lambda _: self.flights.pop(key, None) if self.flights.get(key) is task else None)
+        # A cancelled caller must not cancel the computation the others are waiting for
+        return await asyncio.shield(task)
+
+    def forget(self, key):
+        """
+        Let the next call start a new computation, e.g. after the underlying data changed
+
+        Args:
+            key (Tuple): (operation, args...)
+        """
+        self.flights.pop(key, None)
+
+    def __str__(self):
+        calls = sum(self.call_counts.values())
+        return f"Single flight ({len(self.flights)} in flight, {sum(self.coalesced_counts.values())} of {calls} calls coalesced)"
@@ -8,7 +8,4 @@ def quote_join(messages):
     Returns:
         str: joined string
     """
-    output = ""
-    for message in messages:
-        output += f"\"{message}\", "
-    return output[:-2]
+    return ", ".join(f"\"{message}\"" for message in messages)
@@ -0,0 +1,38 @@
+import os
+import sys
+
+# Stabilize imports
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(current_dir, ".."))  # repository root
+
+from nltk.tokenize import NLTKWordTokenizer
+
+from src.nlp import corpus, primitive_model
+
+# Chat-like messages on top of the intents corpus, contractions and punctuation are where tokenizers disagree
+CHAT_MESSAGES = [
+    "What's up?",
+    "I'm fine, thanks!",
+    "don't do that...",
+    "Hey Tater, can you pat me?",
+]
+
+
+def nltk_preprocess(sentence):
+    # nltk.word_tokenize without the punkt sentence splitter, every message is a single sentence
+    return primitive_model.stem_tokens(NLTKWordTokenizer().tokenize(sentence))
+
+
+def test_regex_tokenizer_matches_nltk():
+    primitive_model.resolve_paths()
+    sentences = [utterance for _, utterance in corpus.iter_utterances(primitive_model.PATH_INTENT)] + CHAT_MESSAGES
+    for sentence in sentences:
+        assert primitive_model.preprocess(sentence, "regex") == nltk_preprocess(sentence), sentence
+
+
+def test_fingerprint_follows_the_tokenizer_in_use(monkeypatch):
+    monkeypatch.setattr(primitive_model.settings, "NLP_TOKENIZER", "nltk")
+    monkeypatch.setattr(primitive_model, "nltk_available", lambda: False)
+    without_punkt = primitive_model.compute_fingerprint()
+    monkeypatch.setattr(primitive_model, "nltk_available", lambda: True)
+    assert primitive_model.compute_fingerprint() != without_punkt